@@ -0,0 +1,336 @@
+import os
+import sys
+import ssl
+import time
+import asyncio
+import datetime
+import argparse
+import requests
+import tempfile
+import threading
+import ipaddress
+import multiprocessing
+
+import h2.config
+import h2.exceptions
+import h2.events
+import h2.settings
+import h2.connection
+import h11
+
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import http2_manager
+
+
+class BenchServer:
+    """
+    A local TLS server that answers every request after a fixed delay, over HTTP/2 or HTTP/1.1 (picked with ALPN).
+    """
+
+    def __init__(self, cert_path: str, key_path: str, delay: float, connect_delay: float, body_size: int, connections: multiprocessing.Value) -> None:
+        """
+        Start the server on a free port.
+
+        :param cert_path: The path to the server certificate.
+        :param key_path: The path to the server key.
+        :param delay: How long to wait before answering each request, in seconds (the server time plus one round trip).
+        :param connect_delay: How long to wait before using a new connection, in seconds (the TCP and TLS handshakes).
+        :param body_size: The size of each response body, in bytes.
+        :param connections: The shared count of connections opened.
+        """
+
+        self.delay: float = delay
+        self.connect_delay: float = connect_delay
+        self.body: bytes = b'<html>' + b'x' * body_size + b'</html>'
+        self.headers: list[tuple[str, str]] = [('content-type', 'text/html; charset=utf-8'), ('content-length', str(len(self.body)))]
+        self.connections: multiprocessing.Value = connections
+
+        self.context: ssl.SSLContext = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        self.context.load_cert_chain(cert_path, key_path)
+        self.context.set_alpn_protocols(['h2', 'http/1.1'])
+
+        self.loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+
+        self.server: asyncio.Server = asyncio.run_coroutine_threadsafe(asyncio.start_server(self.handle, 'localhost', 0, ssl=self.context), self.loop).result()
+        self.port: int = self.server.sockets[0].getsockname()[1]
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Serve a connection.
+
+        :param reader: The connection's reader.
+        :param writer: The connection's writer.
+        :return: None
+        """
+
+        with self.connections.get_lock():
+            self.connections.value += 1
+
+        await asyncio.sleep(self.connect_delay)
+
+        try:
+            if writer.get_extra_info('ssl_object').selected_alpn_protocol() == 'h2':
+                await self.serve_http2(reader, writer)
+            else:
+                await self.serve_http1(reader, writer)
+        except (ConnectionError, h2.exceptions.ProtocolError, h11.ProtocolError):
+            pass
+
+        writer.close()
+
+    async def serve_http2(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Serve an HTTP/2 connection, answering its streams concurrently.
+
+        :param reader: The connection's reader.
+        :param writer: The connection's writer.
+        :return: None
+        """
+
+        connection: h2.connection.H2Connection = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False))
+        connection.initiate_connection()
+        connection.update_settings({h2.settings.SettingCodes.MAX_CONCURRENT_STREAMS: 256})
+        writer.write(connection.data_to_send())
+
+        window_open: asyncio.Event = asyncio.Event()
+        responses: set[asyncio.Task] = set()
+
+        async def respond(stream_id: int) -> None:
+            await asyncio.sleep(self.delay)
+
+            connection.send_headers(stream_id, [(':status', '200')] + self.headers)
+            data: bytes = self.body
+
+            while len(data) > 0:
+                while connection.local_flow_control_window(stream_id) < 1:
+                    window_open.clear()
+                    await window_open.wait()
+
+                size: int = min(connection.local_flow_control_window(stream_id), len(data), connection.max_outbound_frame_size)
+                connection.send_data(stream_id, data[:size], end_stream=size == len(data))
+                data = data[size:]
+                writer.write(connection.data_to_send())
+
+        while True:
+            data: bytes = await reader.read(65536)
+
+            if len(data) == 0:
+                return
+
+            for event in connection.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    task: asyncio.Task = asyncio.create_task(respond(event.stream_id))
+                    responses.add(task)
+                    task.add_done_callback(responses.discard)
+                elif isinstance(event, h2.events.WindowUpdated):
+                    window_open.set()
+                elif isinstance(event, h2.events.ConnectionTerminated):
+                    return
+
+            writer.write(connection.data_to_send())
+
+    async def serve_http1(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Serve an HTTP/1.1 keep-alive connection, one request at a time.
+
+        :param reader: The connection's reader.
+        :param writer: The connection's writer.
+        :return: None
+        """
+
+        connection: h11.Connection = h11.Connection(h11.SERVER)
+
+        while True:
+            event = connection.next_event()
+
+            if event is h11.NEED_DATA:
+                data: bytes = await reader.read(65536)
+                connection.receive_data(data)
+
+                if len(data) == 0:
+                    return
+            elif isinstance(event, h11.EndOfMessage):
+                await asyncio.sleep(self.delay)
+
+                writer.write(connection.send(h11.Response(status_code=200, headers=self.headers)))
+                writer.write(connection.send(h11.Data(data=self.body)))
+                writer.write(connection.send(h11.EndOfMessage()))
+                await writer.drain()
+
+                connection.start_next_cycle()
+            elif isinstance(event, h11.ConnectionClosed):
+                return
+
+
+def server_process(cert_path: str, key_path: str, delay: float, connect_delay: float, body_size: int, connections: multiprocessing.Value, port_queue: multiprocessing.Queue) -> None:
+    """
+    Process function to run the server, apart from the clients so they don't share an interpreter.
+
+    :param cert_path: The path to the server certificate.
+    :param key_path: The path to the server key.
+    :param delay: The server delay per request, in seconds.
+    :param connect_delay: The extra delay per new connection, in seconds.
+    :param body_size: The size of each response body, in bytes.
+    :param connections: The shared count of connections opened.
+    :param port_queue: The queue to hand the server's port back on.
+    :return: None
+    """
+
+    server: BenchServer = BenchServer(cert_path, key_path, delay, connect_delay, body_size, connections)
+    port_queue.put(server.port)
+
+    threading.Event().wait() # Serve until the benchmark terminates the process
+
+
+def generate_certificate(directory: str) -> tuple[str, str]:
+    """
+    Generate a self-signed certificate for localhost.
+
+    :param directory: The directory to write the certificate and key to.
+    :return: The paths to the certificate and the key.
+    """
+
+    key: ec.EllipticCurvePrivateKey = ec.generate_private_key(ec.SECP256R1())
+    name: x509.Name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'localhost')])
+    now: datetime.datetime = datetime.datetime.now(datetime.timezone.utc)
+
+    certificate: x509.Certificate = (x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName('localhost'), x509.IPAddress(ipaddress.ip_address('127.0.0.1'))]), critical=False)
+        .sign(key, hashes.SHA256()))
+
+    cert_path: str = os.path.join(directory, 'cert.pem')
+    key_path: str = os.path.join(directory, 'key.pem')
+
+    with open(cert_path, 'wb') as file:
+        file.write(certificate.public_bytes(serialization.Encoding.PEM))
+
+    with open(key_path, 'wb') as file:
+        file.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL, serialization.NoEncryption()))
+
+    return cert_path, key_path
+
+
+def run_benchmark(base_url: str, sessions: list[requests.Session], request_count: int, verify: str) -> float:
+    """
+    Send the requests from one thread per session, like the scrape threads do.
+
+    :param base_url: The base URL of the server.
+    :param sessions: The sessions, one per thread.
+    :param request_count: The total number of requests to send.
+    :param verify: The path to the CA bundle to verify the server with.
+    :return: How long the requests took, in seconds.
+    """
+
+    thread_count: int = len(sessions)
+    errors: list[str] = []
+
+    def work(thread_number: int) -> None:
+        for i in range(thread_number, request_count, thread_count):
+            try:
+                sessions[thread_number].get(f'{base_url}/wiki/pages/viewinfo.action?pageId={i}', verify=verify).raise_for_status()
+            except requests.exceptions.RequestException as error:
+                errors.append(str(error))
+
+    threads: list[threading.Thread] = [threading.Thread(target=work, args=(i,)) for i in range(0, thread_count)]
+
+    start_time: float = time.time()
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    if len(errors) > 0:
+        print(f'{len(errors)} requests failed, e.g. {errors[0]}')
+
+    return time.time() - start_time
+
+
+def main(thread_counts: list[int], request_count: int, delay: float, connect_delay: float, body_size: int, connection_count: int) -> None:
+    """
+    Compare the HTTP/1.1 and the HTTP/2 transport against a local server.
+
+    :param thread_counts: The numbers of threads to compare at.
+    :param request_count: The number of requests to send per run.
+    :param delay: The server delay per request, in seconds.
+    :param connect_delay: The extra delay per new connection, in seconds.
+    :param body_size: The size of each response body, in bytes.
+    :param connection_count: The number of shared HTTP/2 connections (http2_connections).
+    :return: None
+    """
+
+    if not http2_manager.http2_available():
+        print('The benchmark requires httpx with the http2 extra (pip install httpx[http2]).')
+        exit(1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        cert_path, key_path = generate_certificate(directory)
+
+        connections: multiprocessing.Value = multiprocessing.Value('i', 0)
+        port_queue: multiprocessing.Queue = multiprocessing.Queue()
+
+        server: multiprocessing.Process = multiprocessing.Process(target=server_process, args=(cert_path, key_path, delay, connect_delay, body_size, connections, port_queue), daemon=True)
+        server.start()
+
+        base_url: str = f'https://localhost:{port_queue.get()}'
+
+        print(f'{request_count} GETs, {delay * 1000:.0f} ms per request, {connect_delay * 1000:.0f} ms per new connection, {body_size} byte bodies')
+
+        for thread_count in thread_counts:
+            connections.value = 0
+            http1_sessions: list[requests.Session] = [requests.Session() for _ in range(0, thread_count)]
+            http1_time: float = run_benchmark(base_url, http1_sessions, request_count, cert_path)
+            http1_connections: int = connections.value
+
+            for session in http1_sessions:
+                session.close()
+
+            connections.value = 0
+            adapter: http2_manager.HTTP2Adapter = http2_manager.HTTP2Adapter(connection_count, cert_path)
+            http2_sessions: list[requests.Session] = []
+
+            for _ in range(0, thread_count):
+                session: requests.Session = requests.Session()
+                session.mount(base_url, adapter)
+                http2_sessions.append(session)
+
+            # The crawler's enumeration opens the shared connection before the scrape threads start, and until the server's
+            # settings arrive httpx sends one stream at a time
+            http2_sessions[0].get(base_url, verify=cert_path)
+
+            http2_time: float = run_benchmark(base_url, http2_sessions, request_count, cert_path)
+            http2_connections: int = connections.value
+            adapter.close()
+
+            print(f'{thread_count} threads: HTTP/1.1 {http1_time:.2f} s ({http1_connections} connections), HTTP/2 {http2_time:.2f} s ({http2_connections} connections)')
+
+        server.terminate()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the HTTP/1.1 and the HTTP/2 transport against a local TLS server.')
+
+    parser.add_argument('-t', '--threads', type=str, help='The thread counts to compare at. (e.g., "16,64")', default='16,64')
+    parser.add_argument('-n', '--requests', type=int, help='The number of requests per run.', default=2000)
+    parser.add_argument('-d', '--delay', type=float, help='The server delay per request, in seconds.', default=0.02)
+    parser.add_argument('-cd', '--connect_delay', type=float, help='The extra delay per new connection (handshakes over a slow link), in seconds.', default=0.0)
+    parser.add_argument('-b', '--body', type=int, help='The size of each response body, in bytes.', default=4000)
+    parser.add_argument('-c', '--connections', type=int, help='The number of shared HTTP/2 connections.', default=4)
+
+    args: argparse.Namespace = parser.parse_args()
+
+    main([int(thread_count) for thread_count in args.threads.split(',')], args.requests, args.delay, args.connect_delay, args.body, args.connections)
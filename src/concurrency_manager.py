@@ -0,0 +1,243 @@
+import time
+import requests
+import collections.abc
+import threading
+import urllib.parse
+import requests.adapters
+
+
+# Responses that mean the server wants us to slow down
+OVERLOAD_STATUSES: set[int] = {429, 502, 503, 504}
+
+# How fast the recent and the usual latency follow new requests (about the last 10 and the last 50 requests)
+SHORT_LATENCY_WEIGHT: float = 0.1
+LONG_LATENCY_WEIGHT: float = 0.02
+# Requests to see before latency alone can count as congestion
+LATENCY_WARMUP: int = 20
+
+
+class AIMDLimiter:
+    """
+    Limits the number of in-flight requests with additive-increase/multiplicative-decrease.
+
+    Every request that comes back fine grows the limit by 1/limit (about one more request per round trip).
+    A timeout, a connection error, an overload status or a recent latency well above the usual one cuts it by the decrease factor,
+    at most once per round trip so one burst of failures doesn't collapse it to the minimum.
+
+    Latency is compared between moving averages rather than against the fastest request ever seen, so a host that serves
+    both quick and slow requests (page info next to Word exports) isn't mistaken for an overloaded one.
+    """
+
+    def __init__(self, min_limit: int, max_limit: int, initial_limit: int, decrease_factor: float, latency_factor: float) -> None:
+        """
+        Create the limiter.
+
+        :param min_limit: The min number of in-flight requests.
+        :param max_limit: The max number of in-flight requests.
+        :param initial_limit: The number of in-flight requests to start at.
+        :param decrease_factor: What the limit is multiplied by on congestion (e.g. 0.5).
+        :param latency_factor: How many times the usual latency the recent latency may reach before it counts as congestion.
+        """
+
+        self.min_limit: int = max(1, min_limit)
+        self.max_limit: int = max(self.min_limit, max_limit)
+        self.limit: float = min(max(initial_limit, self.min_limit), self.max_limit)
+        self.decrease_factor: float = decrease_factor
+        self.latency_factor: float = latency_factor
+
+        self.in_flight: int = 0
+        self.short_latency: float | None = None
+        self.long_latency: float | None = None
+        self.latency_count: int = 0
+        self.last_decrease: float = 0.0
+        self.condition: threading.Condition = threading.Condition()
+
+    def acquire(self) -> float:
+        """
+        Wait for a free slot.
+
+        :return: The time the request started.
+        """
+
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+
+            self.in_flight += 1
+
+        return time.monotonic()
+
+    def release(self, start_time: float, congested: bool) -> None:
+        """
+        Free a slot and adjust the limit.
+
+        :param start_time: The time the request started (from acquire).
+        :param congested: The request failed in a way that signals overload.
+        :return: None
+        """
+
+        latency: float = time.monotonic() - start_time
+
+        with self.condition:
+            self.in_flight -= 1
+
+            if not congested:
+                if self.short_latency is None:
+                    self.short_latency = latency
+                    self.long_latency = latency
+                else:
+                    self.short_latency += (latency - self.short_latency) * SHORT_LATENCY_WEIGHT
+                    self.long_latency += (latency - self.long_latency) * LONG_LATENCY_WEIGHT
+
+                self.latency_count += 1
+
+                congested = self.latency_count >= LATENCY_WARMUP and self.short_latency > self.long_latency * self.latency_factor
+
+            if congested:
+                # Requests sent before the last cut were already counted in it
+                if start_time > self.last_decrease:
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self.last_decrease = time.monotonic()
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+            self.condition.notify_all()
+
+
+class AdaptiveConcurrency:
+    """
+    Hands out an AIMD limiter per host (or one for the whole run).
+    """
+
+    def __init__(self, min_limit: int, max_limit: int, initial_limit: int, decrease_factor: float, latency_factor: float, per_host: bool) -> None:
+        """
+        Create the controller.
+
+        :param min_limit: The min number of in-flight requests.
+        :param max_limit: The max number of in-flight requests.
+        :param initial_limit: The number of in-flight requests to start at.
+        :param decrease_factor: What the limit is multiplied by on congestion.
+        :param latency_factor: How many times the usual latency the recent latency may reach before it counts as congestion.
+        :param per_host: Keep a separate limit for every host instead of one for the whole run.
+        """
+
+        self.limiter_args: tuple = (min_limit, max_limit, initial_limit, decrease_factor, latency_factor)
+        self.per_host: bool = per_host
+        self.limiters: dict = {}
+        self.lock: threading.Lock = threading.Lock()
+
+    def get_limiter(self, url: str) -> AIMDLimiter:
+        """
+        Get the limiter for a URL.
+
+        :param url: The URL about to be requested.
+        :return: The limiter.
+        """
+
+        key: str = (urllib.parse.urlsplit(url).hostname or '') if self.per_host else ''
+
+        with self.lock:
+            if key not in self.limiters:
+                self.limiters[key] = AIMDLimiter(*self.limiter_args)
+
+            return self.limiters[key]
+
+    def get_limits(self) -> dict:
+        """
+        Get the current limit of every limiter.
+
+        :return: The limits (host, or '' for the whole run -> limit).
+        """
+
+        with self.lock:
+            return {key: limiter.limit for key, limiter in self.limiters.items()}
+
+
+class LimitedAdapter(requests.adapters.BaseAdapter):
+    """
+    A requests transport adapter that runs another adapter's requests through the adaptive concurrency limits.
+    """
+
+    def __init__(self, adapter: requests.adapters.BaseAdapter, concurrency: AdaptiveConcurrency) -> None:
+        """
+        Wrap an adapter.
+
+        :param adapter: The adapter that sends the requests.
+        :param concurrency: The adaptive concurrency controller.
+        """
+
+        super().__init__()
+
+        self.adapter: requests.adapters.BaseAdapter = adapter
+        self.concurrency: AdaptiveConcurrency = concurrency
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        """
+        Send a request once the limiter for its host has a free slot.
+
+        The slot is held until the body has been downloaded (or, for a streamed response, until it is closed),
+        the HTTP/1.1 adapter returns as soon as the headers arrive.
+
+        :param request: The prepared request.
+        :return: The response.
+        """
+
+        limiter: AIMDLimiter = self.concurrency.get_limiter(request.url)
+        start_time: float = limiter.acquire()
+
+        try:
+            response: requests.Response = self.adapter.send(request, **kwargs)
+
+            if not kwargs.get('stream', False):
+                response.content # Read the body inside the slot
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError):
+            limiter.release(start_time, True)
+            raise
+        except Exception:
+            limiter.release(start_time, False)
+            raise
+
+        congested: bool = response.status_code in OVERLOAD_STATUSES
+
+        if not kwargs.get('stream', False):
+            limiter.release(start_time, congested)
+            return response
+
+        response_close: collections.abc.Callable = response.close
+        released: bool = False
+
+        def close() -> None:
+            nonlocal released
+
+            try:
+                response_close()
+            finally:
+                # Closed more than once (e.g. by a redirect and a with block) but released only once
+                if not released:
+                    released = True
+                    limiter.release(start_time, congested)
+
+        response.close = close
+
+        return response
+
+    def close(self) -> None:
+        """
+        Leave the wrapped adapter open, it may be shared with other sessions (e.g. the HTTP/2 adapter).
+
+        :return: None
+        """
+
+
+def limit_session(session: requests.Session, concurrency: AdaptiveConcurrency) -> None:
+    """
+    Run every request a session makes through the adaptive concurrency limits.
+
+    :param session: The session to limit.
+    :param concurrency: The adaptive concurrency controller.
+    :return: None
+    """
+
+    for prefix, adapter in list(session.adapters.items()):
+        if not isinstance(adapter, LimitedAdapter):
+            session.mount(prefix, LimitedAdapter(adapter, concurrency))
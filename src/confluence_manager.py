@@ -1,7 +1,18 @@
+import re
 import bs4
+import copy
 import time
+import queue
 import requests
 import selenium
+import urllib.parse
+import collections.abc
+
+import progress_manager
+
+
+# /wiki/spaces/<space>/pages/<id>/<title> or /wiki/pages/viewpage.action?pageId=<id>
+INTERNAL_PAGE_LINK_PATTERN: re.Pattern = re.compile(r'/spaces/[^/?#]+/pages/(\d+)(?:[/?#]|$)|/viewpage\.action\?(?:[^#]*&)?pageId=(\d+)')
 
 
 def login_prompt(confluence_login_link: str, webdriver: selenium.webdriver) -> bool | dict:
@@ -67,6 +78,49 @@ def get_pages(session: requests.Session, query_url: str, query: dict) -> list[di
     return pages
 
 
+def get_space_pages(session: requests.Session, query_url: str, query: dict, space_key: str, page_count: int, batch_size: int) -> collections.abc.Iterator[list[dict]]:
+    """
+    Get the pages of a single space from Confluence, one paginated batch at a time.
+
+    :param session: The session to use.
+    :param query_url: The query URL.
+    :param query: The query to use (left unmodified).
+    :param space_key: The key of the space to enumerate.
+    :param page_count: The max number of pages to get from the space.
+    :param batch_size: The number of pages to request per batch.
+    :return: An iterator over the batches of pages.
+    """
+
+    space_query: dict = copy.deepcopy(query)
+    space_query['variables']['filters']['spaces']['spaceKeys'] = [space_key]
+
+    remaining: int = page_count
+    token: str | None = None
+
+    while remaining > 0:
+        space_query['variables']['first'] = min(batch_size, remaining)
+        space_query['variables']['maxNumberOfResults'] = min(batch_size, remaining)
+        space_query['variables']['token'] = token
+
+        response: requests.Response = session.post(query_url, json=space_query, headers={'Content-Type': 'application/json'})
+
+        search: dict = (response.json().get('data', None) or {}).get('confluenceContentSearch', None) or {}
+        pages: list[dict] = (search.get('nodes', None) or [])[:remaining]
+
+        if len(pages) == 0:
+            break
+
+        remaining -= len(pages)
+
+        yield pages
+
+        page_info: dict = search.get('pageInfo', None) or {}
+        token = page_info.get('nextPageToken', None)
+
+        if not page_info.get('hasNextPage', False) or token is None:
+            break
+
+
 def get_page_info(session: requests.Session, page_id: str, page_info_url: str, confluence_base_url: str, default_card_panel_name: str, card_info_skip: dict, verbose: bool) -> dict:
     """
     Get the information for a page.
@@ -190,23 +244,20 @@ def get_page_info(session: requests.Session, page_id: str, page_info_url: str, c
     return data
 
 
-def test_page_links(session: requests.Session, headers: dict, page: dict, base_url: str, link_ignore_types: list[str], ignore_links: list[str], timeout: int) -> dict:
+def get_testable_links(page: dict, base_url: str, link_ignore_types: list[str], ignore_links: list[str]) -> list[str]:
     """
-    Test the links on a page.
+    Get the outgoing links on a page that should be tested.
 
-    :param session: The session to use.
-    :param headers: The headers to use.
-    :param page: The page to test.
+    :param page: The page to get the links from.
     :param base_url: The base URL of the Confluence site.
     :param link_ignore_types: The types of links to ignore.
     :param ignore_links: The links to ignore.
-    :param timeout: The timeout for the request.
-    :return: The links on the page.
+    :return: The absolute links to test.
     """
 
     links: dict = page.get('Outgoing Links', {})
 
-    data: dict = {}
+    testable_links: list[str] = []
 
     for key, value in links.items():
         skip_link: bool = False
@@ -225,10 +276,146 @@ def test_page_links(session: requests.Session, headers: dict, page: dict, base_u
         if value in ignore_links:
             continue
 
+        testable_links.append(value)
+    
+    return testable_links
+
+
+def get_link_hosts(page: dict, base_url: str, link_ignore_types: list[str], ignore_links: list[str]) -> set[str]:
+    """
+    Get the distinct hosts of the links on a page that should be tested.
+
+    :param page: The page to get the hosts from.
+    :param base_url: The base URL of the Confluence site.
+    :param link_ignore_types: The types of links to ignore.
+    :param ignore_links: The links to ignore.
+    :return: The hosts.
+    """
+
+    hosts: set[str] = set()
+
+    for link in get_testable_links(page, base_url, link_ignore_types, ignore_links):
+        try:
+            host: str | None = urllib.parse.urlsplit(link).hostname
+        except ValueError:
+            continue
+
+        if host is not None:
+            hosts.add(host)
+    
+    return hosts
+
+
+def get_internal_page_id(link: str, base_url: str) -> str | None:
+    """
+    Get the page ID an internal Confluence page link points to.
+
+    :param link: The absolute link.
+    :param base_url: The base URL of the Confluence site.
+    :return: The page ID, None if the link isn't a page link on this Confluence site.
+    """
+
+    if not link.startswith(base_url):
+        return None
+
+    match: re.Match | None = INTERNAL_PAGE_LINK_PATTERN.search(link[len(base_url):])
+
+    if match is None:
+        return None
+
+    return match.group(1) or match.group(2)
+
+
+def lookup_pages(session: requests.Session, lookup_url: str, page_ids: set[str], batch_size: int = 250) -> dict:
+    """
+    Check which pages exist with the batched page lookup API.
+
+    :param session: The session to use.
+    :param lookup_url: The lookup URL (the comma separated page IDs are appended to it).
+    :param page_ids: The IDs of the pages to check.
+    :param batch_size: The number of pages to check per request.
+    :return: The status of each page that could be checked (200 if it exists, 404 otherwise).
+    """
+
+    page_statuses: dict = {}
+    page_id_list: list[str] = sorted(page_ids)
+
+    for i in range(0, len(page_id_list), batch_size):
+        batch: list[str] = page_id_list[i:i + batch_size]
+
+        try:
+            response: requests.Response = session.get(f'{lookup_url}{",".join(batch)}')
+        except requests.exceptions.RequestException:
+            continue
+
+        # Leave the batch to the regular link check if the lookup isn't available
+        if response.status_code != 200:
+            continue
+
+        # A 200 can still be an SSO or interstitial page instead of the API's JSON
+        try:
+            found_ids: set[str] = {str(page.get('id', '')) for page in response.json().get('results', [])}
+        except (ValueError, AttributeError):
+            continue
+
+        for page_id in batch:
+            page_statuses[page_id] = 200 if page_id in found_ids else 404
+    
+    return page_statuses
+
+
+def test_page_links(session: requests.Session, headers: dict, page: dict, base_url: str, link_ignore_types: list[str], ignore_links: list[str], timeout: int, unresolved_hosts: set[str] | None = None, previous_failures: set[str] | None = None, page_statuses: dict | None = None, progress_queue: queue.SimpleQueue | None = None) -> dict:
+    """
+    Test the links on a page.
+
+    :param session: The session to use.
+    :param headers: The headers to use.
+    :param page: The page to test.
+    :param base_url: The base URL of the Confluence site.
+    :param link_ignore_types: The types of links to ignore.
+    :param ignore_links: The links to ignore.
+    :param timeout: The timeout for the request.
+    :param unresolved_hosts: Hosts known not to resolve, reported without an HTTP attempt.
+    :param previous_failures: Links that failed last run, tested first.
+    :param page_statuses: Known statuses of Confluence pages by ID, internal links to them are answered without a request.
+    :param progress_queue: The queue to publish each request's host, latency and size to, None to not report progress.
+    :return: The links on the page.
+    """
+
+    data: dict = {}
+
+    links: list[str] = get_testable_links(page, base_url, link_ignore_types, ignore_links)
+
+    if previous_failures:
+        links.sort(key=lambda link: link not in previous_failures)
+
+    for value in links:
+        if page_statuses:
+            page_id: str | None = get_internal_page_id(value, base_url)
+
+            if page_id in page_statuses:
+                data[value] = page_statuses[page_id]
+                continue
+
+        try:
+            host: str | None = urllib.parse.urlsplit(value).hostname
+        except ValueError:
+            host = None
+
+        if unresolved_hosts and host in unresolved_hosts:
+            data[value] = 'Unresolvable host'
+            continue
+
+        request_start_time: float = time.monotonic()
+
         try:
             response = session.get(value, timeout=timeout, headers=headers)
             data[value] = response.status_code
+
+            progress_manager.publish(progress_queue, 'link', host, time.monotonic() - request_start_time, len(response.content))
         except Exception as error:
+            progress_manager.publish(progress_queue, 'link', host, time.monotonic() - request_start_time, 0)
+
             data[value] = error
 
             # This assumes that Upgrade-Insecure-Requests is disabled in the headers.
@@ -0,0 +1,177 @@
+import time
+import socket
+import threading
+import concurrent.futures
+
+
+_original_getaddrinfo = socket.getaddrinfo
+
+dns_cache: dict = {}
+dns_cache_lock: threading.Lock = threading.Lock()
+dns_cache_ttl: float = 300
+
+resolver_pool: concurrent.futures.ThreadPoolExecutor | None = None
+host_futures: dict = {}
+host_futures_lock: threading.Lock = threading.Lock()
+
+# Lookups that fail like this will keep failing, anything else (e.g. EAI_AGAIN under load) may succeed on a retry
+PERMANENT_ERRORS: set[int] = {socket.EAI_NONAME} | ({socket.EAI_NODATA} if hasattr(socket, 'EAI_NODATA') else set())
+TRANSIENT_RETRIES: int = 2
+
+
+def cached_getaddrinfo(host: str, port: int | str | None, family: int = 0, type: int = 0, proto: int = 0, flags: int = 0) -> list:
+    """
+    Drop-in replacement for socket.getaddrinfo that shares lookups across every session in the process.
+
+    :param host: The host to resolve.
+    :param port: The port to resolve.
+    :param family: The address family.
+    :param type: The socket type.
+    :param proto: The protocol.
+    :param flags: The getaddrinfo flags.
+    :return: The address info list.
+    """
+
+    # Only plain TCP lookups are cached, anything unusual goes straight to the resolver
+    if not isinstance(host, str) or type not in (0, socket.SOCK_STREAM) or proto != 0 or flags != 0:
+        return _original_getaddrinfo(host, port, family, type, proto, flags)
+
+    try:
+        port_number: int = int(port) if port is not None else 0
+    except (TypeError, ValueError):
+        return _original_getaddrinfo(host, port, family, type, proto, flags)
+
+    results: list = resolve_host(host)
+
+    if family != socket.AF_UNSPEC:
+        results = [result for result in results if result[0] == family]
+
+        if len(results) == 0:
+            raise socket.gaierror(socket.EAI_FAMILY, f'No address for {host} in the requested family.')
+
+    return [(result_family, result_type, result_proto, canonname, (sockaddr[0], port_number, *sockaddr[2:])) for result_family, result_type, result_proto, canonname, sockaddr in results]
+
+
+def resolve_host(host: str) -> list:
+    """
+    Resolve a host through the cache.
+
+    Only lookups that will keep failing (the host doesn't exist) are cached as failures, transient errors are retried
+    and then raised without being cached so the next lookup tries again.
+
+    :param host: The host to resolve.
+    :return: The address info list (with port 0).
+    """
+
+    host = host.lower()
+
+    with dns_cache_lock:
+        entry: tuple | None = dns_cache.get(host, None)
+
+    if entry is not None and entry[0] > time.time():
+        if isinstance(entry[1], Exception):
+            raise entry[1]
+
+        return entry[1]
+
+    for attempt in range(0, TRANSIENT_RETRIES + 1):
+        try:
+            results: list | Exception = _original_getaddrinfo(host, None, socket.AF_UNSPEC, socket.SOCK_STREAM)
+            break
+        except UnicodeError as error:
+            results = error
+            break
+        except socket.gaierror as error:
+            if is_permanent_error(error):
+                results = error
+                break
+
+            if attempt == TRANSIENT_RETRIES:
+                raise
+
+            time.sleep(0.1 * (attempt + 1))
+
+    with dns_cache_lock:
+        dns_cache[host] = (time.time() + dns_cache_ttl, results)
+
+    if isinstance(results, Exception):
+        raise results
+
+    return results
+
+
+def is_permanent_error(error: Exception) -> bool:
+    """
+    Check if a lookup error means the host doesn't exist (as opposed to e.g. a resolver timeout).
+
+    :param error: The error raised by the lookup.
+    :return: True if the lookup will keep failing, False otherwise.
+    """
+
+    return isinstance(error, UnicodeError) or (isinstance(error, socket.gaierror) and error.errno in PERMANENT_ERRORS)
+
+
+def install_dns_cache(ttl: float = 300, resolver_count: int = 16) -> None:
+    """
+    Install the process-wide DNS cache.
+
+    :param ttl: How long a lookup (successful, or failed because the host doesn't exist) is kept, in seconds.
+    :param resolver_count: The number of threads resolving hosts ahead of the link checks.
+    :return: None
+    """
+
+    global dns_cache_ttl, resolver_pool
+
+    dns_cache_ttl = ttl
+    resolver_pool = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, resolver_count), thread_name_prefix='resolver')
+    socket.getaddrinfo = cached_getaddrinfo
+
+
+def try_resolve(host: str) -> bool | None:
+    """
+    Resolve a host on the resolver pool.
+
+    :param host: The host to resolve.
+    :return: True if it resolved, False if it doesn't exist, None if the lookup failed for another reason.
+    """
+
+    try:
+        resolve_host(host)
+    except (socket.gaierror, UnicodeError) as error:
+        return False if is_permanent_error(error) else None
+
+    return True
+
+
+def resolve_hosts(hosts: set[str]) -> set[str]:
+    """
+    Resolve hosts in parallel on the resolver pool and wait for them, warming the cache.
+
+    A host already being resolved for another thread is waited on instead of being looked up again.
+
+    :param hosts: The hosts to resolve.
+    :return: The hosts that don't exist (hosts that failed for another reason are left to the regular request).
+    """
+
+    unresolved_hosts: set[str] = set()
+    futures: dict = {}
+
+    with host_futures_lock:
+        for host in hosts:
+            if host not in host_futures:
+                host_futures[host] = resolver_pool.submit(try_resolve, host)
+
+            futures[host] = host_futures[host]
+
+    for host, future in futures.items():
+        resolved: bool | None = future.result()
+
+        if resolved is False:
+            unresolved_hosts.add(host)
+        elif resolved is None:
+            # Let a later page try the host again
+            with host_futures_lock:
+                if host_futures.get(host, None) is future:
+                    del host_futures[host]
+
+    return unresolved_hosts
@@ -0,0 +1,252 @@
+import os
+import re
+import json
+import time
+import queue
+import zipfile
+import requests
+
+
+TASK_ID_PATTERN: re.Pattern = re.compile(r'taskId=([\w-]+)')
+# The link sits in HTML inside the task's JSON messages, so its quotes and slashes may be escaped
+DOWNLOAD_LINK_PATTERN: re.Pattern = re.compile(r'href=\\?"([^"]*?download\\?/temp\\?/[^"]*?)\\?"')
+
+
+def get_page_entry_name(page_id: str) -> str:
+    """
+    Get the name of a page's entry inside an export archive.
+
+    :param page_id: The ID of the page.
+    :return: The entry name.
+    """
+
+    return f'pages/{page_id}.doc'
+
+
+def archive_writer_thread(archive_path: str, export_queue: queue.Queue, verbose: bool) -> None:
+    """
+    Thread function to stream exported pages into a compressed archive.
+
+    This is the only thread that touches the archive, the export workers hand it (page_id, title, content) tuples.
+    A None item closes the archive. If the archive can't be written (e.g. the disk is full) the queue is still drained,
+    so the workers never block on it.
+
+    :param archive_path: The path to the archive.
+    :param export_queue: The queue of exported pages.
+    :param verbose: Enable verbose mode.
+    :return: None
+    """
+
+    index: dict = {}
+
+    try:
+        archive: zipfile.ZipFile | None = zipfile.ZipFile(archive_path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=6)
+    except Exception as error:
+        print(f'Failed to create the export archive {archive_path}: {error}')
+        archive = None
+
+    while True:
+        item: tuple | None = export_queue.get()
+
+        if item is None:
+            break
+
+        page_id, title, content = item
+
+        if archive is None or page_id in index:
+            continue
+
+        entry_name: str = get_page_entry_name(page_id)
+
+        try:
+            archive.writestr(entry_name, content)
+        except Exception as error:
+            print(f'Failed to write to the export archive {archive_path}, no more pages will be exported: {error}')
+
+            try:
+                archive.close()
+            except Exception:
+                pass
+
+            archive = None
+            continue
+
+        index[page_id] = {'title': title, 'entry': entry_name, 'size': len(content)}
+
+    if archive is None:
+        return
+
+    try:
+        archive.writestr('index.json', json.dumps(index, indent=4))
+        archive.close()
+    except Exception as error:
+        print(f'Failed to finish the export archive {archive_path}: {error}')
+        return
+
+    if verbose:
+        print(f'Exported {len(index)} pages to {archive_path}.')
+
+
+def extract_page(archive_path: str, page_id: str, out_path: str) -> str | None:
+    """
+    Extract a single page from an export archive without unpacking the rest.
+
+    :param archive_path: The path to the archive.
+    :param page_id: The ID of the page to extract.
+    :param out_path: The directory to extract the page into.
+    :return: The path of the extracted page, None if the page is not in the archive.
+    """
+
+    with zipfile.ZipFile(archive_path, 'r') as archive:
+        try:
+            content: bytes = archive.read(get_page_entry_name(page_id))
+        except KeyError:
+            return None
+
+        index: dict = json.loads(archive.read('index.json')) if 'index.json' in archive.namelist() else {}
+
+    title: str = index.get(page_id, {}).get('title', page_id)
+    page_path: str = f'{out_path}{title.replace(os.sep, "_")}.doc'
+
+    with open(page_path, 'wb') as file:
+        file.write(content)
+
+    return page_path
+
+
+def export_page(session: requests.Session, page_id: str, title: str, download_link: str, export_path: str, export_queue: queue.Queue | None) -> int:
+    """
+    Download a page's Word export and hand it to the archive writer, or write it as a loose file.
+
+    :param session: The session to use.
+    :param page_id: The ID of the page.
+    :param title: The title of the page.
+    :param download_link: The page's Word export link.
+    :param export_path: The path to export the word documents.
+    :param export_queue: The queue to hand exported pages to the archive writer on, None to write loose files.
+    :return: The number of bytes downloaded.
+    """
+
+    response: requests.Response = session.get(download_link)
+
+    if response.status_code == 200 and export_queue is not None:
+        export_queue.put((page_id, title, response.content))
+    elif response.status_code == 200:
+        with open(f'{export_path}{title.replace(os.sep, "_")}.doc', 'wb') as file:
+            file.write(response.content)
+
+    return len(response.content)
+
+
+def start_space_export(session: requests.Session, space_export_url: str, space_key: str, export_type: str, timeout: float) -> str | None:
+    """
+    Start Confluence's space-level export job for a space.
+
+    :param session: The session to use.
+    :param space_export_url: The space export URL (the space key is appended to it).
+    :param space_key: The key of the space to export.
+    :param export_type: The export type (e.g. TYPE_HTML, TYPE_XML).
+    :param timeout: The timeout for the request.
+    :return: The ID of the export task, None if the space can't be bulk exported.
+    """
+
+    form: dict = {'exportType': export_type, 'contentOption': 'all', 'includeComments': 'true', 'synchronous': 'false'}
+
+    try:
+        response: requests.Response = session.post(f'{space_export_url}{space_key}', data=form, headers={'X-Atlassian-Token': 'no-check'}, allow_redirects=False, timeout=timeout)
+    except requests.exceptions.RequestException:
+        return None
+
+    if response.status_code not in (200, 302, 303):
+        return None
+
+    # The task ID comes back in the redirect to the progress page (or in the page itself)
+    match: re.Match | None = TASK_ID_PATTERN.search(response.headers.get('Location', '')) or TASK_ID_PATTERN.search(response.text)
+
+    if match is None:
+        return None
+
+    return match.group(1)
+
+
+def space_export_thread(session: requests.Session, space_key: str, task_id: str, longtask_url: str, confluence_base_url: str, export_path: str, poll_interval: float, export_timeout: float, timeout: float, export_results: dict, verbose: bool) -> None:
+    """
+    Thread function to wait for a space export job and stream its archive to disk.
+
+    The outcome is stored in export_results (space key -> True once the archive is on disk, False otherwise),
+    so a space whose job fails can still be exported page by page.
+
+    :param session: The session to use.
+    :param space_key: The key of the exported space.
+    :param task_id: The ID of the export task.
+    :param longtask_url: The long running task URL (the task ID is appended to it).
+    :param confluence_base_url: The base URL of the Confluence site.
+    :param export_path: The path to export the archive to.
+    :param poll_interval: How long to wait between polls, in seconds.
+    :param export_timeout: How long to wait for the job before giving up, in seconds.
+    :param timeout: The timeout for each request (the polls are cut short at the deadline, the download may take as long as it keeps receiving data).
+    :param export_results: The shared outcome of every space export.
+    :param verbose: Enable verbose mode.
+    :return: None
+    """
+
+    export_results[space_key] = False
+
+    deadline: float = time.time() + export_timeout
+    download_link: str | None = None
+
+    while time.time() < deadline:
+        try:
+            # A hung poll mustn't outlast the deadline
+            response: requests.Response = session.get(f'{longtask_url}{task_id}', timeout=max(0.1, min(timeout, deadline - time.time())))
+            task: dict = response.json()
+        except (requests.exceptions.RequestException, ValueError):
+            time.sleep(poll_interval)
+            continue
+
+        if task.get('finished', False):
+            if not task.get('successful', False):
+                print(f'The export of {space_key} failed.')
+                return
+
+            match: re.Match | None = DOWNLOAD_LINK_PATTERN.search(response.text)
+
+            if match is not None:
+                download_link = match.group(1).replace('\\/', '/')
+
+            break
+
+        if verbose:
+            print(f'Exporting {space_key}: {task.get("percentageComplete", 0)}%')
+
+        time.sleep(poll_interval)
+
+    if download_link is None:
+        print(f'Failed to get the export of {space_key}.')
+        return
+
+    if download_link.startswith('/'):
+        download_link = f'{confluence_base_url}{download_link}'
+
+    archive_path: str = f'{export_path}{space_key.replace(os.sep, "_")}_{time.strftime("%Y-%m-%d_%H-%M-%S")}.zip'
+
+    try:
+        with session.get(download_link, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+
+            with open(archive_path, 'wb') as file:
+                for chunk in response.iter_content(chunk_size=1024 * 1024):
+                    file.write(chunk)
+    except (requests.exceptions.RequestException, OSError) as error:
+        print(f'Failed to download the export of {space_key}: {error}')
+
+        # Don't leave a truncated archive that looks like a finished export
+        if os.path.exists(archive_path):
+            os.remove(archive_path)
+
+        return
+
+    export_results[space_key] = True
+
+    if verbose:
+        print(f'Exported {space_key} to {archive_path}.')
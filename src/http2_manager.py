@@ -0,0 +1,216 @@
+import os
+import ssl
+import asyncio
+import requests
+import threading
+import http.client
+import importlib.util
+import requests.cookies
+import requests.adapters
+import requests.structures
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+# Connection-specific headers are forbidden in HTTP/2 (RFC 9113 8.2.2), servers reset the stream if they are sent
+HOP_BY_HOP_HEADERS: set[str] = {'connection', 'keep-alive', 'proxy-connection', 'transfer-encoding', 'upgrade', 'host'}
+
+
+def http2_available() -> bool:
+    """
+    Check if the HTTP/2 transport can be used (needs httpx with the http2 extra).
+
+    :return: True if HTTP/2 is available, False otherwise.
+    """
+
+    return httpx is not None and importlib.util.find_spec('h2') is not None
+
+
+def get_ssl_context(verify: bool | str, cert: str | tuple | None) -> ssl.SSLContext:
+    """
+    Build the TLS settings requests would use from its verify and cert options.
+
+    :param verify: Verify the TLS certificates (True, False or the path to a CA bundle or directory).
+    :param cert: The client certificate (a path, a (cert, key) tuple or None).
+    :return: The SSL context.
+    """
+
+    if verify is False:
+        context: ssl.SSLContext = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    elif isinstance(verify, str) and os.path.isdir(verify):
+        context = ssl.create_default_context(capath=verify)
+    elif isinstance(verify, str):
+        context = ssl.create_default_context(cafile=verify)
+    else:
+        context = ssl.create_default_context()
+
+    if isinstance(cert, tuple):
+        context.load_cert_chain(*cert)
+    elif cert is not None:
+        context.load_cert_chain(cert)
+
+    return context
+
+
+class HTTP2RawResponse:
+    """
+    Stands in for the urllib3 response under requests.Response.raw, which requests reads the Set-Cookie headers from.
+    """
+
+    def __init__(self, headers: list[tuple[str, str]]) -> None:
+        """
+        Wrap the response headers.
+
+        :param headers: The response headers (repeated headers as separate items).
+        """
+
+        self.msg: http.client.HTTPMessage = http.client.HTTPMessage()
+
+        for key, value in headers:
+            self.msg.add_header(key, value)
+
+        self._original_response: HTTP2RawResponse = self
+
+    def close(self) -> None:
+        """
+        Nothing to close, the body has already been read.
+
+        :return: None
+        """
+
+
+class HTTP2Adapter(requests.adapters.BaseAdapter):
+    """
+    A requests transport adapter that sends requests over a shared, multiplexed HTTP/2 client.
+
+    One adapter is mounted on every session for the Confluence base URL, so all threads share the same few connections.
+    The client lives on its own event loop thread: a TLS socket can't be read and written from several threads at once,
+    so the worker threads hand their requests to the loop instead of driving the connections themselves.
+
+    The client is set up once with the session's TLS and proxy settings. A request that asks for different ones
+    is sent over HTTP/1.1 instead, so no setting is silently ignored.
+    """
+
+    def __init__(self, max_connections: int = 4, verify: bool | str = True, cert: str | tuple | None = None, proxy: str | None = None) -> None:
+        """
+        Create the adapter.
+
+        :param max_connections: The max number of connections to open to each host.
+        :param verify: Verify the TLS certificates (True, False or the path to a CA bundle or directory).
+        :param cert: The client certificate (a path, a (cert, key) tuple or None).
+        :param proxy: The proxy URL to send the requests through, None to connect directly.
+        """
+
+        super().__init__()
+
+        self.verify: bool | str = verify
+        self.cert: str | tuple | None = cert
+        self.proxy: str | None = proxy
+        self.fallback_adapter: requests.adapters.HTTPAdapter = requests.adapters.HTTPAdapter()
+        self.fallback_warned: bool = False
+
+        ssl_context: ssl.SSLContext = get_ssl_context(verify, cert)
+
+        self.loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+        self.loop_thread: threading.Thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.loop_thread.start()
+
+        async def create_client() -> httpx.AsyncClient:
+            # The settings come from requests (including its environment variables), httpx mustn't apply its own on top
+            return httpx.AsyncClient(http2=True, verify=ssl_context, proxy=proxy, trust_env=False, follow_redirects=False, limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections))
+
+        self.client: httpx.AsyncClient = asyncio.run_coroutine_threadsafe(create_client(), self.loop).result()
+
+    def send(self, request: requests.PreparedRequest, stream: bool = False, timeout: float | tuple | None = None, verify: bool | str = True, cert: str | tuple | None = None, proxies: dict | None = None) -> requests.Response:
+        """
+        Send a prepared request over HTTP/2.
+
+        :param request: The prepared request.
+        :param stream: Ignored, the whole body is always read.
+        :param timeout: The timeout (a single value or a (connect, read) tuple).
+        :param verify: Verify the TLS certificates, sent over HTTP/1.1 if it differs from the adapter's.
+        :param cert: The client certificate, sent over HTTP/1.1 if it differs from the adapter's.
+        :param proxies: The proxies, sent over HTTP/1.1 if the request's proxy differs from the adapter's.
+        :return: The response.
+        """
+
+        if verify != self.verify or cert != self.cert or requests.utils.select_proxy(request.url, proxies or {}) != self.proxy:
+            if not self.fallback_warned:
+                self.fallback_warned = True
+                print('A request uses different TLS or proxy settings than the HTTP/2 transport, sending it over HTTP/1.1.')
+
+            return self.fallback_adapter.send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+
+        if isinstance(timeout, tuple):
+            http2_timeout: httpx.Timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        else:
+            http2_timeout = httpx.Timeout(timeout)
+
+        headers: dict = {key: value for key, value in request.headers.items() if key.lower() not in HOP_BY_HOP_HEADERS}
+
+        # A server may drain a connection (GOAWAY) mid-flight, the requests it didn't finish are safe to send again
+        attempts: int = 2 if request.method in ('GET', 'HEAD', 'OPTIONS') else 1
+
+        for attempt in range(0, attempts):
+            try:
+                http2_response: httpx.Response = asyncio.run_coroutine_threadsafe(self.client.request(request.method, request.url, headers=headers, content=request.body, timeout=http2_timeout), self.loop).result()
+                break
+            except httpx.TimeoutException as error:
+                raise requests.exceptions.Timeout(error, request=request)
+            except httpx.RemoteProtocolError as error:
+                if attempt + 1 >= attempts:
+                    raise requests.exceptions.ConnectionError(error, request=request)
+            except httpx.HTTPError as error:
+                raise requests.exceptions.ConnectionError(error, request=request)
+
+        response: requests.Response = requests.Response()
+        response.status_code = http2_response.status_code
+        response.reason = http2_response.reason_phrase
+        response.headers = requests.structures.CaseInsensitiveDict(http2_response.headers.multi_items())
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.raw = HTTP2RawResponse(http2_response.headers.multi_items())
+        response._content = http2_response.content
+        response._content_consumed = True
+
+        # The session picks the cookies up from raw as well, so refreshed session tokens aren't lost
+        requests.cookies.extract_cookies_to_jar(response.cookies, request, response.raw)
+
+        return response
+
+    def close(self) -> None:
+        """
+        Close the shared client and stop its event loop.
+
+        :return: None
+        """
+
+        if not self.loop.is_running():
+            return
+
+        asyncio.run_coroutine_threadsafe(self.client.aclose(), self.loop).result()
+        self.fallback_adapter.close()
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.loop_thread.join()
+
+
+def share_http2(source_session: requests.Session, session: requests.Session) -> None:
+    """
+    Mount the HTTP/2 adapter of one session (if it has one) on another.
+
+    :param source_session: The session to copy the HTTP/2 mount from.
+    :param session: The session to mount it on.
+    :return: None
+    """
+
+    for prefix, adapter in source_session.adapters.items():
+        if isinstance(adapter, HTTP2Adapter):
+            session.mount(prefix, adapter)
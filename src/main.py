@@ -1,26 +1,36 @@
 import os
 import time
 import json
+import queue
 import shutil
 import getpass
 import requests
 import argparse
 import selenium
 import threading
+import concurrent.futures
 
 import driver
+import dns_manager
 import data_manager
+import export_manager
+import progress_manager
+import concurrency_manager
+import http2_manager
+import replay_manager
+import sample_manager
+import schedule_manager
 import confluence_manager
 
 
-def scrape_thread(thread_number: int, session: requests.Session, headers: dict, pages: dict, confluence_info: dict, default_card_panel_name: str, card_info_skip: dict, link_ignore_types: list[str], ignore_links: list[str], timeout: int, export: bool, export_path: str, verbose: bool) -> None:
+def scrape_thread(thread_number: int, session: requests.Session, headers: dict, page_queue: queue.PriorityQueue, confluence_info: dict, default_card_panel_name: str, card_info_skip: dict, link_ignore_types: list[str], ignore_links: list[str], timeout: int, export: bool, export_path: str, export_queue: queue.Queue | None, page_export_spaces: set[str] | None, deferred_exports: dict, pre_resolve: bool, unresolved_hosts: set[str], page_lookup_url: str, page_statuses: dict, page_lookup_futures: dict, page_lookup_lock: threading.Lock, previous_failures: set[str], progress_queue: queue.SimpleQueue | None, verbose: bool) -> None:
     """
     Thread function to scrape the pages.
 
     :param thread_number: The thread number.
     :param session: The session to use.
     :param headers: The headers to use.
-    :param pages: The pages to scrape.
+    :param page_queue: The priority queue of pages to scrape (schedule_manager.END_OF_PAGES ends the thread's enumeration).
     :param confluence_info: The Confluence info.
     :param default_card_panel_name: The default card panel name.
     :param card_info_skip: The card info to skip.
@@ -29,6 +39,17 @@ def scrape_thread(thread_number: int, session: requests.Session, headers: dict,
     :param timeout: The timeout to use.
     :param export: Export the pages to word documents.
     :param export_path: The path to export the word documents.
+    :param export_queue: The queue to hand exported pages to the archive writer on, None to write loose files.
+    :param page_export_spaces: The spaces to export page by page, None for every space.
+    :param deferred_exports: The export links of the pages in bulk exported spaces (space key -> list of (page ID, title, link)), in case the space export fails.
+    :param pre_resolve: Resolve the hosts of each page's links in parallel before checking them.
+    :param unresolved_hosts: The shared set of hosts that don't exist.
+    :param page_lookup_url: The batched page lookup URL (the comma separated page IDs are appended to it).
+    :param page_statuses: The shared statuses of Confluence pages by ID (the enumerated pages and the ones looked up).
+    :param page_lookup_futures: The shared lookups of page IDs already handed to the page lookup (page ID -> future done once its status is known).
+    :param page_lookup_lock: The lock guarding page_lookup_futures.
+    :param previous_failures: The links that failed last run, checked first.
+    :param progress_queue: The queue to publish progress events to, None to not report progress.
     :param verbose: Enable verbose mode.
     :return: None
     """
@@ -38,71 +59,137 @@ def scrape_thread(thread_number: int, session: requests.Session, headers: dict,
     confluence_base_url: str = confluence_info.get('base_url', '')
     confluence_page_info_url: str = f'{confluence_base_url}{confluence_info.get('page_info_url', '')}'
 
-    info: dict = {"current_page": "", "page_count_given": len(pages.keys()), "page_count": 0, "link_count" : 0, "failed_links": {}}
+    info: dict = {"link_count" : 0, "failed_links": {}}
 
-    for key, value in pages.items():
-        page: dict = confluence_manager.get_page_info(session, key, confluence_page_info_url, confluence_base_url, default_card_panel_name, card_info_skip, verbose)
+    # Pages arrive most recently edited first and are checked as soon as they arrive
+    while True:
+        item: tuple = page_queue.get()
+
+        if item == schedule_manager.END_OF_PAGES:
+            break
+
+        _, key, value, space_key = item
+
+        # A page that can't be read mustn't take the thread (and the rest of its pages) down
+        try:
+            page: dict = confluence_manager.get_page_info(session, key, confluence_page_info_url, confluence_base_url, default_card_panel_name, card_info_skip, verbose)
+        except Exception as error:
+            progress_manager.publish(progress_queue, 'error', f'{value}: {error}')
+
+            if verbose:
+                print(f'Failed to get the info of {value}: {error}')
+
+            # Still count it as done, otherwise the pages done never reach the total and the ETA never settles
+            progress_manager.publish(progress_queue, 'page', 0, 0, 0)
+            continue
+
+        links: list[str] = confluence_manager.get_testable_links(page, confluence_base_url, link_ignore_types, ignore_links)
+
+        # Pages that weren't enumerated (yet) are looked up in one batch, each ID only once across the threads
+        with page_lookup_lock:
+            unknown_page_ids: set[str] = {page_id for page_id in (confluence_manager.get_internal_page_id(link, confluence_base_url) for link in links) if page_id is not None and page_id not in page_statuses}
+            lookup_page_ids: set[str] = {page_id for page_id in unknown_page_ids if page_id not in page_lookup_futures}
+            pending_lookups: set[concurrent.futures.Future] = {page_lookup_futures[page_id] for page_id in unknown_page_ids - lookup_page_ids}
 
-        info['current_page'] = value
-        info['page_count'] += 1
+            lookup_future: concurrent.futures.Future = concurrent.futures.Future()
 
-        page_links: dict = confluence_manager.test_page_links(session, headers, page, confluence_base_url, link_ignore_types, ignore_links, timeout)
+            for page_id in lookup_page_ids:
+                page_lookup_futures[page_id] = lookup_future
 
-        if export:
-            page_download_link: str = page.get(default_card_panel_name, {}).get('Export As', {}).get('Word', None)
+        # Pages the lookup can't answer are checked with a regular request instead
+        if len(lookup_page_ids) > 0:
+            try:
+                page_statuses.update(confluence_manager.lookup_pages(session, page_lookup_url, lookup_page_ids))
+            except Exception as error:
+                progress_manager.publish(progress_queue, 'error', f'Page lookup: {error}')
+            finally:
+                lookup_future.set_result(None)
 
-            if page_download_link is not None:
-                page_data: requests.Response = session.get(page_download_link)
+        # IDs another thread is already looking up are waited for instead of being fetched in full
+        concurrent.futures.wait(pending_lookups)
 
-                if page_data.status_code == 200:
-                    with open(f'{export_path}{value.replace(os.sep, '_')}.doc', 'wb') as file:
-                        file.write(page_data.content)
+        if pre_resolve:
+            unresolved_hosts.update(dns_manager.resolve_hosts(confluence_manager.get_link_hosts(page, confluence_base_url, link_ignore_types, ignore_links)))
+
+        page_links: dict = confluence_manager.test_page_links(session, headers, page, confluence_base_url, link_ignore_types, ignore_links, timeout, unresolved_hosts, previous_failures, page_statuses, progress_queue)
+        page_bytes: int = 0
+
+        page_download_link: str | None = page.get(default_card_panel_name, {}).get('Export As', {}).get('Word', None)
+
+        if export and page_download_link is not None and (page_export_spaces is None or space_key in page_export_spaces):
+            try:
+                page_bytes += export_manager.export_page(session, key, value, page_download_link, export_path, export_queue)
+            except requests.exceptions.RequestException as error:
+                progress_manager.publish(progress_queue, 'error', f'{value}: {error}')
+        elif export and page_download_link is not None:
+            deferred_exports[space_key].append((key, value, page_download_link))
+
+        page_failed_links: int = 0
 
         for link, status in page_links.items():
             info['link_count'] += 1
 
             if status not in (200, 401):
+                # Only count the links the summary counts, each failed link once per thread
+                if link not in info['failed_links']:
+                    page_failed_links += 1
+
                 info['failed_links'][link] = value
         
         thread_info[thread_number] = info
+
+        progress_manager.publish(progress_queue, 'page', len(page_links), page_failed_links, page_bytes)
     
     session = None # Clear the session
 
 
-def info_thread() -> None:
+def enumerate_thread(space_key: str, session: requests.Session, query_url: str, query_data: dict, page_count: int, batch_size: int, page_queue: queue.PriorityQueue, space_progress: dict, enumerated_page_ids: set[str], enumerated_page_ids_lock: threading.Lock, page_statuses: dict, progress_queue: queue.SimpleQueue | None, verbose: bool) -> None:
     """
-    Thread function to print the info.
+    Thread function to enumerate the pages of a single space.
 
+    :param space_key: The key of the space to enumerate.
+    :param session: The session to use.
+    :param query_url: The query URL.
+    :param query_data: The query data to use.
+    :param page_count: The max number of pages to get from the space.
+    :param batch_size: The number of pages to request per batch.
+    :param page_queue: The priority queue the pages are handed to the scrape threads on, most recently edited first.
+    :param space_progress: The shared per-space progress.
+    :param enumerated_page_ids: The shared set of page IDs already handed to the scrape threads.
+    :param enumerated_page_ids_lock: The lock guarding enumerated_page_ids.
+    :param page_statuses: The shared statuses of Confluence pages by ID, every enumerated page exists.
+    :param progress_queue: The queue to publish progress events to, None to not report progress.
+    :param verbose: Enable verbose mode.
     :return: None
     """
 
-    global thread_info
+    progress: dict = {"page_count": 0}
+    space_progress[space_key] = progress
 
-    while True:
-        status_lines: list[str] = []
+    try:
+        for pages_raw in confluence_manager.get_space_pages(session, query_url, query_data, space_key, page_count, batch_size):
+            # A page is only checked once, even if the query returns it again
+            with enumerated_page_ids_lock:
+                pages_raw = [page for page in pages_raw if page['id'] not in enumerated_page_ids]
+                enumerated_page_ids.update(page['id'] for page in pages_raw)
 
-        if thread_info == {}:
-            print('Waiting for threads to start...')
+            # Links to these pages are answered without a request from here on
+            page_statuses.update({page['id']: 200 for page in pages_raw})
 
-            time.sleep(0.5)
-            continue
+            for page in pages_raw:
+                # A page without a title is named by its ID in the logs and exports
+                page_queue.put((schedule_manager.get_last_modified_priority(page), page['id'], page.get('title', None) or page['id'], space_key))
 
-        threads_alive: bool = False
+            progress['page_count'] += len(pages_raw)
 
-        for thread_number, info in thread_info.items():
-            status_lines.append(f'T{thread_number}: {info["page_count"]/info["page_count_given"] * 100:.2f}%')
-
-            if not (info['page_count'] >= info['page_count_given']):
-                threads_alive = True
-        
-        if not threads_alive:
-            print('Threads finished.')
+            progress_manager.publish(progress_queue, 'enumerated', len(pages_raw))
+    except Exception as error:
+        progress_manager.publish(progress_queue, 'error', f'{space_key}: {error}')
 
-            break
-        
-        print(' | '.join(status_lines), end='\r')
+        print(f'Failed to enumerate the pages of {space_key}: {error}')
 
-        time.sleep(0.5)
+    if verbose:
+        print(f'Found {progress["page_count"]} pages in {space_key}.')
 
 
 def generate_log(thread_info: dict, logs_path: str, verbose: bool) -> None:
@@ -130,21 +217,30 @@ def generate_log(thread_info: dict, logs_path: str, verbose: bool) -> None:
             file.write('\n')
 
 
-def main(data: dict, query_data: dict, headers:dict, page_count: int, thread_count: int, export: bool, export_path: str, log: bool, logs_path: str, cookie_cache: bool | dict, cookie_path: str, master_key: bytes | None, verbose: bool) -> None:
+def main(data: dict, query_data: dict, headers:dict, page_count: int, thread_count: int, export: bool, export_path: str, export_archive: bool, bulk_export: bool, log: bool, logs_path: str, cookie_cache: bool | dict, cookie_path: str, history_path: str, master_key: bytes | None, sample_precision: float | None, record_path: str | None, replay_path: str | None, http2: bool, adaptive: bool, progress_json: str | None, verbose: bool) -> None:
     """
     Main function to check the links in Confluence.
 
     :param data: The data to use.
     :param query_data: The query data to use.
     :param headers: The headers to use.
-    :param page_count: The max number of pages to check.
+    :param page_count: The max number of pages to check per space.
     :param thread_count: The number of threads to use.
     :param export: Export the pages to word documents.
     :param export_path: The path to export the word documents.
+    :param export_archive: Stream the exported pages into a single compressed archive.
+    :param bulk_export: Export each space with Confluence's space export, falling back to page by page exports.
     :param logs_path: The path to the logs.
     :param cookie_cache: The cookie cache.
     :param cookie_path: The path to the cookie cache.
+    :param history_path: The path to the failed link history used to prioritize the next run.
     :param master_key: The master key to use.
+    :param sample_precision: Only estimate the failure rates from a random sample, to this precision. None to check everything.
+    :param record_path: The path to record every response to, None to not record.
+    :param replay_path: The path to a recorded archive to answer every request from instead of the network, None to use the network.
+    :param http2: Send the requests to the Confluence site over a shared, multiplexed HTTP/2 transport.
+    :param adaptive: Adjust the number of in-flight requests (up to thread_count) with AIMD instead of always running thread_count.
+    :param progress_json: The path to append machine readable progress lines to ('-' for stdout), None to not write them.
     :param verbose: Enable verbose mode.
     :return: None
     """
@@ -157,24 +253,31 @@ def main(data: dict, query_data: dict, headers:dict, page_count: int, thread_cou
     confluence_base_url: str = confluence_info.get('base_url', '')
     confluence_query_url: str = f'{confluence_base_url}{confluence_info.get('query_url', '')}'
     
-    spaces: list[str] = confluence_info.get('spaces', [])
+    spaces: list[str] = list(dict.fromkeys(confluence_info.get('spaces', []))) # Each space once, in order
 
     if None in confluence_info.values():
         print('Please fill in the Confluence info in the data file.')
         exit(1)
 
-    query_data['variables']['filters']['spaces']['spaceKeys'] = spaces # Update the spaces to check
-    query_data['variables']['first'] = page_count
-    query_data['variables']['maxNumberOfResults'] = page_count
+    page_batch_size: int = data.get('page_batch_size', 100)
 
     timeout: int = data.get('timeout', 3)
 
+    dns_manager.install_dns_cache(data.get('dns_ttl', 300), max(thread_count, 16))
+
+    if replay_path is not None:
+        replay_manager.install_replayer(replay_path)
+    elif record_path is not None:
+        replay_manager.install_recorder(record_path, confluence_base_url)
+
     default_card_panel_name: str = data.get('default_card_panel_name', 'Basic Info')
     link_ignore_types: list[str] = data.get('link_ignore_types', [])
     ignore_links: list[str] = data.get('ignore_links', [])
     card_info_skip: dict = data.get('info_skip', {})
 
-    if cookie_cache is not False:
+    if replay_path is not None:
+        cookies: list = [] # Nothing to log in to, every response comes from the archive
+    elif cookie_cache is not False:
         if len(cookie_cache) == 0:
             cookie_cache = False
         else:
@@ -191,7 +294,7 @@ def main(data: dict, query_data: dict, headers:dict, page_count: int, thread_cou
             cookies: dict = cookie_cache
 
     # Open the browser and login to Confluence to get the cookies
-    if cookie_cache is False:
+    if replay_path is None and cookie_cache is False:
         if verbose:
             browser_start_time: float = time.time()
             print(f'Setup took {time.time() - start_time:.2f} seconds.')
@@ -205,14 +308,14 @@ def main(data: dict, query_data: dict, headers:dict, page_count: int, thread_cou
         print('Failed to login to Confluence.')
         exit(1)
     
-    if verbose and cookie_cache is False:
+    if verbose and replay_path is None and cookie_cache is False:
         print(f'Browser setup took {time.time() - browser_start_time:.2f} seconds.')
         print('Checking pages...')
 
     scan_session: requests.Session = requests.Session() # Create a session to use the cookies
 
     # Save the cookies to the cache
-    if cookie_cache is False and cookies is not False and master_key is not None:
+    if replay_path is None and cookie_cache is False and cookies is not False and master_key is not None:
         try:
             with open(cookie_path, 'wb') as file:
                 file.write(data_manager.encrypt_data(json.dumps(cookies), master_key))
@@ -222,57 +325,233 @@ def main(data: dict, query_data: dict, headers:dict, page_count: int, thread_cou
 
     for cookie in cookies:
         scan_session.cookies.set(cookie['name'], cookie['value'])
+
+    http2_adapter: http2_manager.HTTP2Adapter | None = None
+
+    if http2 and not http2_manager.http2_available():
+        print('HTTP/2 requires httpx with the http2 extra (pip install httpx[http2]), falling back to HTTP/1.1.')
+    elif http2:
+        # The same TLS and proxy settings requests would use for the Confluence site
+        http2_settings: dict = scan_session.merge_environment_settings(confluence_base_url, {}, None, None, None)
+        http2_adapter = http2_manager.HTTP2Adapter(data.get('http2_connections', 4), http2_settings['verify'], http2_settings['cert'], requests.utils.select_proxy(confluence_base_url, http2_settings['proxies']))
+        scan_session.mount(confluence_base_url, http2_adapter)
     
-    pages_raw: list[dict] = confluence_manager.get_pages(scan_session, confluence_query_url, query_data)
-    pages: dict = {page['id']: page['title'] for page in pages_raw}
+    if sample_precision is not None:
+        sample_manager.run_sample(scan_session, headers, confluence_query_url, query_data, spaces, page_batch_size, thread_count, confluence_info, default_card_panel_name, card_info_skip, link_ignore_types, ignore_links, timeout, sample_precision, data.get('sample_confidence', 0.95), data.get('sample_links_per_page', 5), data.get('sample_min_links', 30), verbose)
+
+        replay_manager.close_archive()
+
+        if http2_adapter is not None:
+            http2_adapter.close()
+
+        if verbose:
+            print(f'Sampling took {time.time() - start_time:.2f} seconds.')
+
+        return
 
     link_count: int = 0
     failed_link_count: int = 0
 
-    if verbose:
-        print(f'Found {len(pages.keys())} pages!')
+    previous_failures: set[str] = schedule_manager.load_previous_failures(history_path)
+
+    progress_queue: queue.SimpleQueue | None = None
+
+    if verbose or progress_json is not None:
+        progress_queue = queue.SimpleQueue()
 
-    page_chunks: list[dict] = [{} for _ in range(thread_count)]
-    for idx, (page_id, page_title) in enumerate(pages.items()):
-        page_chunks[idx % thread_count][page_id] = page_title
+        # The status line would garble the progress lines if both went to stdout
+        reporter: threading.Thread = threading.Thread(target=progress_manager.reporter_thread, args=(progress_queue, data.get('progress_interval', 1), verbose and progress_json != '-', progress_json))
+        reporter.start()
+
+    unresolved_hosts: set[str] = set()
+    page_statuses: dict = {}
+    page_lookup_futures: dict = {}
+    page_lookup_lock: threading.Lock = threading.Lock()
+
+    confluence_page_lookup_url: str = f'{confluence_base_url}{confluence_info.get("page_lookup_url", "/wiki/api/v2/pages?limit=250&id=")}'
+
+    # requests never resolves the hosts it sends to a proxy, and a replay never touches the network
+    pre_resolve: bool = replay_path is None and len(requests.utils.getproxies()) == 0
+
+    # Which pages are looked up depends on how far enumeration got, so a replay reuses the recorded answers
+    if replay_path is not None:
+        unresolved_hosts.update(replay_manager.get_value('unresolved_hosts', []))
+        page_statuses.update(replay_manager.get_value('page_statuses', {}))
+    elif not pre_resolve and verbose:
+        print('A proxy is configured, skipping DNS pre-resolution.')
+    # Pages flow straight from the per-space enumerators to the scrape threads
+    page_queue: queue.PriorityQueue = queue.PriorityQueue()
+    space_progress: dict = {}
+    enumerated_page_ids: set[str] = set()
+    enumerated_page_ids_lock: threading.Lock = threading.Lock()
+    enumerate_threads: list[threading.Thread] = []
+
+    for space_key in spaces:
+        space_session: requests.Session = requests.Session()
+        space_session.cookies.update(scan_session.cookies)
+        http2_manager.share_http2(scan_session, space_session)
+
+        thread: threading.Thread = threading.Thread(target=enumerate_thread, args=(space_key, space_session, confluence_query_url, query_data, page_count, page_batch_size, page_queue, space_progress, enumerated_page_ids, enumerated_page_ids_lock, page_statuses, progress_queue, verbose))
+        enumerate_threads.append(thread)
+        thread.start()
 
     threads: list[threading.Thread] = []
 
+    page_export_spaces: set[str] | None = None
+    space_export_threads: list[threading.Thread] = []
+    space_export_results: dict = {}
+    deferred_exports: dict = {}
+
+    if export and bulk_export:
+        space_export_url: str = f'{confluence_base_url}{confluence_info.get("space_export_url", "/wiki/spaces/doexportspace.action?key=")}'
+        longtask_url: str = f'{confluence_base_url}{confluence_info.get("longtask_url", "/wiki/rest/api/longtask/")}'
+        export_type: str = data.get('space_export_type', 'TYPE_HTML')
+
+        def begin_space_export(space_key: str) -> tuple[requests.Session, str | None]:
+            # Plain HTTP/1.1 sessions so the archives stream to disk instead of being buffered
+            export_session: requests.Session = requests.Session()
+            export_session.cookies.update(scan_session.cookies)
+
+            return export_session, export_manager.start_space_export(export_session, space_export_url, space_key, export_type, timeout)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(spaces))) as executor:
+            space_exports: list[tuple] = list(executor.map(begin_space_export, spaces))
+
+        page_export_spaces = set()
+
+        for space_key, (export_session, task_id) in zip(spaces, space_exports):
+            if task_id is None:
+                if verbose:
+                    print(f'Space export is not available for {space_key}, exporting it page by page.')
+
+                page_export_spaces.add(space_key)
+                continue
+
+            deferred_exports[space_key] = []
+
+            thread: threading.Thread = threading.Thread(target=export_manager.space_export_thread, args=(export_session, space_key, task_id, longtask_url, confluence_base_url, export_path, data.get('space_export_poll_interval', 5), data.get('space_export_timeout', 3600), timeout, space_export_results, verbose))
+            space_export_threads.append(thread)
+            thread.start()
+
+    export_queue: queue.Queue | None = None
+
+    if export and export_archive:
+        archive_path: str = f'{export_path}export_{time.strftime('%Y-%m-%d_%H-%M-%S')}.zip'
+        export_queue = queue.Queue(maxsize=thread_count * 4) # Keep the workers from buffering whole spaces in memory
+
+        archive_thread: threading.Thread = threading.Thread(target=export_manager.archive_writer_thread, args=(archive_path, export_queue, verbose))
+        archive_thread.start()
+
+    concurrency: concurrency_manager.AdaptiveConcurrency | None = None
+
+    if adaptive:
+        concurrency = concurrency_manager.AdaptiveConcurrency(data.get('adaptive_min_concurrency', 1), thread_count, data.get('adaptive_initial_concurrency', 4), data.get('adaptive_decrease_factor', 0.5), data.get('adaptive_latency_factor', 3), data.get('adaptive_per_host', True))
+
     scraping_start_time: float = time.time()
 
     for i in range(0, thread_count):
         session: requests.Session = requests.Session()
         session.cookies.update(scan_session.cookies)
+        http2_manager.share_http2(scan_session, session)
+
+        if concurrency is not None:
+            concurrency_manager.limit_session(session, concurrency)
 
         if verbose:
             print(f'Starting thread {i}...')
 
-        thread: threading.Thread = threading.Thread(target=scrape_thread, args=(i, session, headers, page_chunks[i], confluence_info, default_card_panel_name, card_info_skip, link_ignore_types, ignore_links, timeout, export, export_path, verbose))
+        thread: threading.Thread = threading.Thread(target=scrape_thread, args=(i, session, headers, page_queue, confluence_info, default_card_panel_name, card_info_skip, link_ignore_types, ignore_links, timeout, export, export_path, export_queue, page_export_spaces, deferred_exports, pre_resolve, unresolved_hosts, confluence_page_lookup_url, page_statuses, page_lookup_futures, page_lookup_lock, previous_failures, progress_queue, verbose))
         threads.append(thread)
         thread.start()
     
-    # verify that the thread count cant excede what was specified
-    if verbose and thread_count > 1:
-        info_thread_thread: threading.Thread = threading.Thread(target=info_thread)
-        info_thread_thread.start()
+    for thread in enumerate_threads:
+        thread.join()
+
+    enumerated_page_count: int = sum(progress["page_count"] for progress in space_progress.values())
+
+    progress_manager.publish(progress_queue, 'enumeration_done', enumerated_page_count)
+
+    if verbose:
+        print(f'Found {enumerated_page_count} pages across {len(space_progress)} spaces!')
+
+    for _ in range(0, thread_count):
+        page_queue.put(schedule_manager.END_OF_PAGES) # Tell each scrape thread enumeration is over
     
     for thread in threads:
         thread.join()
+
+    for thread in space_export_threads:
+        thread.join()
+
+    # Spaces whose export job started but didn't deliver an archive are exported page by page after all
+    failed_export_spaces: list[str] = [space_key for space_key in deferred_exports if space_export_results.get(space_key, False) is not True]
+
+    if len(failed_export_spaces) > 0:
+        if verbose:
+            print(f'Exporting {", ".join(failed_export_spaces)} page by page instead...')
+
+        deferred_pages: list[tuple] = [page for space_key in failed_export_spaces for page in deferred_exports[space_key]]
+
+        def export_deferred_pages(pages: list[tuple]) -> None:
+            export_session: requests.Session = requests.Session()
+            export_session.cookies.update(scan_session.cookies)
+            http2_manager.share_http2(scan_session, export_session)
+
+            for key, value, page_download_link in pages:
+                try:
+                    progress_manager.publish(progress_queue, 'export', export_manager.export_page(export_session, key, value, page_download_link, export_path, export_queue))
+                except requests.exceptions.RequestException as error:
+                    progress_manager.publish(progress_queue, 'error', f'{value}: {error}')
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=thread_count) as executor:
+            list(executor.map(export_deferred_pages, [deferred_pages[i::thread_count] for i in range(0, thread_count)]))
+
+    # Every worker is done (or dead), so the reporter can't be left waiting
+    if progress_queue is not None:
+        progress_queue.put(None)
+        reporter.join()
+
+    if export_queue is not None:
+        export_queue.put(None) # Close the archive
+        archive_thread.join()
+
+    if verbose and len(unresolved_hosts) > 0:
+        print(f'Failed to resolve {len(unresolved_hosts)} hosts.')
+
+    if record_path is not None:
+        replay_manager.record_value('unresolved_hosts', sorted(unresolved_hosts))
+        replay_manager.record_value('page_statuses', page_statuses)
+
+    if verbose and concurrency is not None:
+        for key, limit in sorted(concurrency.get_limits().items(), key=lambda item: item[1])[:10]:
+            print(f'Concurrency limit for {key or "the run"}: {limit:.1f}')
     
-    if verbose and thread_count > 1:
-        info_thread_thread.join()
-    
+    replay_manager.close_archive()
+
+    if http2_adapter is not None:
+        http2_adapter.close()
+
     if log:
         generate_log(thread_info, logs_path, verbose)
 
+    failed_links: set[str] = set()
+
     for thread_number, info in thread_info.items():
         link_count += info['link_count']
         failed_link_count += len(info['failed_links'])
+        failed_links.update(info['failed_links'].keys())
 
         if verbose:
             for link, page in info['failed_links'].items():
                 print(f'Failed link: {link} : {page}')
 
+    if replay_path is None:
+        try:
+            schedule_manager.save_failures(history_path, failed_links)
+        except OSError:
+            if verbose:
+                print('Failed to save the failed link history.')
+
     if verbose:
         print(f'Checking took {time.time() - scraping_start_time:.2f} seconds.')
 
@@ -290,11 +569,20 @@ if __name__ == '__main__':
     parser.add_argument('-d', '--data', type=str, help='The path to the data directory.')
     parser.add_argument('-q', '--query', type=str, help='The path to a queryJSON file.')
     parser.add_argument('-head', '--headers', type=str, help='The path to the headers file.')
-    parser.add_argument('-c', '--count', type=int, help='The max number of pages to check.', default=250)
+    parser.add_argument('-c', '--count', type=int, help='The max number of pages to check per space.', default=250)
     parser.add_argument('-t', '--threads', type=int, help='The number of threads to use.', default=1)
     parser.add_argument('-s', '--spaces', type=str, help='The spaces to check. (e.g., "space1,space2")')
+    parser.add_argument('-a', '--adaptive', action='store_true', help='Adapt the number of in-flight requests to latency and errors, using --threads as the upper bound.')
+    parser.add_argument('-pj', '--progress_json', type=str, help='Append machine readable progress lines (JSON) to this file, or "-" for stdout.')
     parser.add_argument('-v', '--verbose', action='store_true', help='Enable verbose mode.')
     parser.add_argument('-e', '--export', action='store_true', help='Export the pages to word documents.')
+    parser.add_argument('-ea', '--export_archive', action='store_true', help='Export the pages into a single compressed archive instead of loose files.')
+    parser.add_argument('-be', '--bulk_export', action='store_true', help='Export each space as a whole with Confluence\'s space export, falling back to page by page exports where it isn\'t available.')
+    parser.add_argument('-x', '--extract', nargs=2, metavar=('ARCHIVE', 'PAGE_ID'), help='Extract a single page from an export archive and exit.')
+    parser.add_argument('-sm', '--sample', type=float, nargs='?', const=0.02, help='Only estimate the failure rates from a random sample of pages and links, stopping once the estimates are within this precision. (default: 0.02)')
+    parser.add_argument('-rec', '--record', type=str, help='Record every response to this archive for later replay.')
+    parser.add_argument('-rep', '--replay', type=str, help='Run against a recorded archive instead of Confluence, without any network access.')
+    parser.add_argument('-http2', '--http2', action='store_true', help='Send the Confluence requests over HTTP/2 (requires httpx[http2]).')
     parser.add_argument('-l', '--log', action='store_true', help='Generate a log of the failed links.')
     parser.add_argument('-op', '--out_path', type=str, help='The path to the out data (logs and exports). Defaults to directory program is run in.')
     parser.add_argument('-cache', '--cache', action='store_true', help='Use the cache.')
@@ -391,6 +679,7 @@ if __name__ == '__main__':
     query_path: str = f'{data_path}pages_query.json'
 
     cookie_path: str = f'{cache_path}cookies.enc'
+    history_path: str = f'{cache_path}failed_links.json'
 
     master_key: bytes | None = None
 
@@ -432,6 +721,17 @@ if __name__ == '__main__':
     if not os.path.exists(logs_path):
         os.makedirs(logs_path)
 
+    if args.extract:
+        archive_path, page_id = args.extract
+        page_path: str | None = export_manager.extract_page(archive_path, page_id, export_path)
+
+        if page_path is None:
+            print(f'Failed to find page {page_id} in {archive_path}.')
+            exit(1)
+
+        print(f'Extracted page {page_id} to {page_path}.')
+        exit(0)
+
     if not os.path.exists(cache_path):
         os.makedirs(cache_path)
 
@@ -488,4 +788,4 @@ if __name__ == '__main__':
 
     thread_info: dict = {} # Define here!
 
-    main(data, query, headers, args.count, args.threads, args.export, export_path, args.log, logs_path, cookie_cache, cookie_path, master_key, args.verbose)
\ No newline at end of file
+    main(data, query, headers, args.count, args.threads, args.export or args.export_archive or args.bulk_export, export_path, args.export_archive, args.bulk_export, args.log, logs_path, cookie_cache, cookie_path, history_path, master_key, args.sample, args.record, args.replay, args.http2 or data.get('http2', False), args.adaptive, args.progress_json, args.verbose)
\ No newline at end of file
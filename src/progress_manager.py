@@ -0,0 +1,162 @@
+import sys
+import json
+import time
+import queue
+
+
+def publish(progress_queue: queue.SimpleQueue | None, event: str, *fields) -> None:
+    """
+    Publish a progress event (a no-op if progress isn't being reported).
+
+    Events: ('enumerated', page_count), ('enumeration_done', total_page_count), ('page', links_checked, links_failed, bytes),
+    ('link', host, seconds, bytes), ('export', bytes) and ('error', message).
+
+    A page's links_failed only counts the links its thread hadn't already seen fail, the same count the final summary adds up.
+
+    :param progress_queue: The queue of progress events, None if progress isn't being reported.
+    :param event: The event type.
+    :param fields: The event fields.
+    :return: None
+    """
+
+    if progress_queue is not None:
+        progress_queue.put((event, *fields))
+
+
+def format_duration(seconds: float | None) -> str:
+    """
+    Format a duration for the status line.
+
+    :param seconds: The duration in seconds, None if unknown.
+    :return: The formatted duration.
+    """
+
+    if seconds is None:
+        return '?'
+
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+
+    if hours > 0:
+        return f'{hours}h {minutes}m'
+
+    if minutes > 0:
+        return f'{minutes}m {seconds}s'
+
+    return f'{seconds}s'
+
+
+def reporter_thread(progress_queue: queue.SimpleQueue, interval: float, show_status: bool, json_path: str | None) -> None:
+    """
+    Thread function to aggregate the progress events and report them every interval.
+
+    Runs until a None event is published, which main does once every worker has been joined, so a dead worker can't stall it.
+
+    :param progress_queue: The queue of progress events.
+    :param interval: How often to report, in seconds.
+    :param show_status: Print a human readable status line.
+    :param json_path: The path to append machine readable progress lines to ('-' for stdout), None to not write them.
+    :return: None
+    """
+
+    json_file = None
+
+    if json_path == '-':
+        json_file = sys.stdout
+    elif json_path is not None:
+        json_file = open(json_path, 'a')
+
+    start_time: float = time.time()
+    last_report: float = start_time
+    last_pages_done: int = 0
+    last_links_checked: int = 0
+
+    pages_total: int = 0
+    enumeration_done: bool = False
+    pages_done: int = 0
+    links_checked: int = 0
+    links_failed: int = 0
+    byte_count: int = 0
+    error_count: int = 0
+    host_latency: dict = {}
+
+    pages_rate: float | None = None
+    links_rate: float | None = None
+    running: bool = True
+
+    while running:
+        try:
+            event: tuple | None = progress_queue.get(timeout=max(0.0, last_report + interval - time.time()))
+        except queue.Empty:
+            event = ()
+
+        if event is None:
+            running = False
+        elif len(event) > 0:
+            match event[0]:
+                case 'enumerated':
+                    pages_total += event[1]
+                case 'enumeration_done':
+                    pages_total = event[1]
+                    enumeration_done = True
+                case 'page':
+                    pages_done += 1
+                    links_checked += event[1]
+                    links_failed += event[2]
+                    byte_count += event[3]
+                case 'link':
+                    host_latency.setdefault(event[1], [0.0, 0])
+                    host_latency[event[1]][0] += event[2]
+                    host_latency[event[1]][1] += 1
+                    byte_count += event[3]
+                case 'export':
+                    byte_count += event[1]
+                case 'error':
+                    error_count += 1
+
+            if time.time() < last_report + interval:
+                continue
+
+        now: float = time.time()
+        elapsed: float = max(now - last_report, 1e-6)
+
+        # Smooth the rates so the ETA doesn't jump around between reports
+        interval_pages_rate: float = (pages_done - last_pages_done) / elapsed
+        interval_links_rate: float = (links_checked - last_links_checked) / elapsed
+        pages_rate = interval_pages_rate if pages_rate is None else pages_rate * 0.7 + interval_pages_rate * 0.3
+        links_rate = interval_links_rate if links_rate is None else links_rate * 0.7 + interval_links_rate * 0.3
+
+        last_report = now
+        last_pages_done = pages_done
+        last_links_checked = links_checked
+
+        eta: float | None = (pages_total - pages_done) / pages_rate if enumeration_done and pages_rate > 0 else None
+        slowest_hosts: list = sorted(((host, total / count) for host, (total, count) in host_latency.items()), key=lambda item: item[1], reverse=True)[:3]
+
+        if json_file is not None:
+            json_file.write(json.dumps({
+                'time': now,
+                'elapsed': now - start_time,
+                'pages_done': pages_done,
+                'pages_total': pages_total,
+                'enumeration_done': enumeration_done,
+                'links_checked': links_checked,
+                'links_failed': links_failed,
+                'bytes': byte_count,
+                'errors': error_count,
+                'pages_per_second': pages_rate,
+                'links_per_second': links_rate,
+                'eta_seconds': eta,
+                'slowest_hosts': [{'host': host, 'mean_seconds': latency} for host, latency in slowest_hosts],
+                'finished': not running
+            }) + '\n')
+            json_file.flush()
+
+        if show_status:
+            slowest: str = ', '.join(f'{host} {latency:.2f}s' for host, latency in slowest_hosts)
+            total: str = f'{pages_total}' if enumeration_done else f'{pages_total}+'
+
+            print(f'{pages_done}/{total} pages | {pages_rate:.1f} pages/s | {links_rate:.1f} links/s | {links_failed} failed | {error_count} errors | ETA {format_duration(eta)} | slowest: {slowest or "-"}', end='\r' if running else '\n')
+
+    if json_file is not None and json_file is not sys.stdout:
+        json_file.close()
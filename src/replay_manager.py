@@ -0,0 +1,200 @@
+import json
+import atexit
+import hashlib
+import zipfile
+import requests
+import threading
+import requests.structures
+
+
+_original_request = requests.Session.request
+
+archive: zipfile.ZipFile | None = None
+archive_index: dict = {}
+archive_values: dict = {}
+archive_lock: threading.Lock = threading.Lock()
+body_prefixes: tuple[str, ...] = ()
+
+
+def get_request_key(method: str, url: str, kwargs: dict) -> str:
+    """
+    Get the key a request is stored under in the archive.
+
+    :param method: The HTTP method.
+    :param url: The URL.
+    :param kwargs: The keyword arguments given to requests.Session.request.
+    :return: The key.
+    """
+
+    request_data: str = json.dumps([method.upper(), url, kwargs.get('params', None), kwargs.get('data', None), kwargs.get('json', None)], sort_keys=True, default=str)
+
+    return hashlib.sha1(request_data.encode()).hexdigest()
+
+
+def recording_request(self: requests.Session, method: str, url: str, *args, **kwargs) -> requests.Response:
+    """
+    Drop-in replacement for requests.Session.request that saves every response to the archive.
+
+    :param self: The session.
+    :param method: The HTTP method.
+    :param url: The URL.
+    :return: The response.
+    """
+
+    key: str = get_request_key(method, url, kwargs)
+
+    try:
+        response: requests.Response = _original_request(self, method, url, *args, **kwargs)
+    except requests.exceptions.RequestException as error:
+        store_entry(key, {'method': method.upper(), 'url': url, 'error': str(error)}, b'')
+        raise
+
+    # Only the Confluence responses are parsed, for link probes the status is all that matters.
+    # Streamed downloads (space export archives) are left to the caller instead of being buffered in memory.
+    body: bytes = response.content if url.startswith(body_prefixes) and not kwargs.get('stream', False) else b''
+
+    store_entry(key, {'method': method.upper(), 'url': url, 'status_code': response.status_code, 'content_type': response.headers.get('Content-Type', None)}, body)
+
+    return response
+
+
+def replaying_request(self: requests.Session, method: str, url: str, *args, **kwargs) -> requests.Response:
+    """
+    Drop-in replacement for requests.Session.request that answers from the archive without touching the network.
+
+    :param self: The session.
+    :param method: The HTTP method.
+    :param url: The URL.
+    :return: The recorded response.
+    """
+
+    key: str = get_request_key(method, url, kwargs)
+    entry: dict | None = archive_index.get(key, None)
+
+    if entry is None:
+        raise requests.exceptions.ConnectionError(f'{method.upper()} {url} is not in the replay archive.')
+
+    if 'error' in entry:
+        raise requests.exceptions.ConnectionError(entry['error'])
+
+    response: requests.Response = requests.Response()
+    response.status_code = entry['status_code']
+    response.url = url
+    response.headers = requests.structures.CaseInsensitiveDict({'Content-Type': entry['content_type']} if entry['content_type'] is not None else {})
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+
+    with archive_lock:
+        response._content = archive.read(f'responses/{key}') if entry['has_body'] else b''
+
+    # There's no connection behind the response, so streaming and closing it must only touch the content
+    response._content_consumed = True
+
+    return response
+
+
+def store_entry(key: str, entry: dict, body: bytes) -> None:
+    """
+    Store a response in the archive.
+
+    :param key: The request key.
+    :param entry: The response metadata.
+    :param body: The response body.
+    :return: None
+    """
+
+    entry['has_body'] = len(body) > 0
+
+    with archive_lock:
+        # A request finishing after the archive was closed (e.g. on exit) has nowhere to go
+        if archive is None or key in archive_index:
+            return
+
+        if entry['has_body']:
+            archive.writestr(f'responses/{key}', body)
+
+        archive_index[key] = entry
+
+
+def record_value(name: str, value: object) -> None:
+    """
+    Store a value that isn't an HTTP response (e.g. the DNS pre-resolution results) in the archive.
+
+    :param name: The name of the value.
+    :param value: The JSON serializable value.
+    :return: None
+    """
+
+    with archive_lock:
+        archive_values[name] = value
+
+
+def get_value(name: str, default: object = None) -> object:
+    """
+    Get a value stored with record_value from the archive being replayed.
+
+    :param name: The name of the value.
+    :param default: The value to return if it wasn't recorded.
+    :return: The value.
+    """
+
+    return archive_values.get(name, default)
+
+
+def install_recorder(archive_path: str, confluence_base_url: str) -> None:
+    """
+    Record every request made through requests to an archive.
+
+    :param archive_path: The path to the archive.
+    :param confluence_base_url: The base URL of the Confluence site, responses from it are stored with their bodies.
+    :return: None
+    """
+
+    global archive, body_prefixes
+
+    archive = zipfile.ZipFile(archive_path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=6)
+    body_prefixes = (confluence_base_url,)
+
+    requests.Session.request = recording_request
+
+    # Keep the recording if the run exits early (exit(1), Ctrl-C)
+    atexit.register(close_archive)
+
+
+def install_replayer(archive_path: str) -> None:
+    """
+    Answer every request made through requests from a recorded archive.
+
+    :param archive_path: The path to the archive.
+    :return: None
+    """
+
+    global archive, archive_index, archive_values
+
+    archive = zipfile.ZipFile(archive_path, 'r')
+    archive_index = json.loads(archive.read('index.json'))
+    archive_values = json.loads(archive.read('values.json'))
+
+    requests.Session.request = replaying_request
+
+
+def close_archive() -> None:
+    """
+    Finish the archive (writing the index when recording) and restore requests.
+
+    :return: None
+    """
+
+    global archive
+
+    requests.Session.request = _original_request
+
+    if archive is None:
+        return
+
+    with archive_lock:
+        if archive.mode == 'w':
+            archive.writestr('index.json', json.dumps(archive_index))
+            archive.writestr('values.json', json.dumps(archive_values))
+
+        archive.close()
+        archive = None
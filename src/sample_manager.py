@@ -0,0 +1,271 @@
+import sys
+import math
+import random
+import statistics
+import requests
+import urllib.parse
+import concurrent.futures
+
+import http2_manager
+import confluence_manager
+
+
+def wilson_interval(failures: float, total: float, z: float) -> tuple[float, float]:
+    """
+    Get the Wilson score interval for a failure rate.
+
+    :param failures: The number of failed links (may be fractional when it is an effective count).
+    :param total: The number of checked links (may be fractional when it is an effective count).
+    :param z: The z-score of the confidence level (1.96 for 95%).
+    :return: The lower and upper bound of the failure rate.
+    """
+
+    if total == 0:
+        return 0.0, 1.0
+
+    rate: float = failures / total
+    denominator: float = 1 + z ** 2 / total
+    center: float = (rate + z ** 2 / (2 * total)) / denominator
+    margin: float = z * math.sqrt(rate * (1 - rate) / total + z ** 2 / (4 * total ** 2)) / denominator
+
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def estimate_rate(clusters: list[tuple[float, float, int]], z: float) -> tuple[float, float, float]:
+    """
+    Estimate a failure rate from the sampled pages, with a confidence interval that accounts for links on the same page failing together.
+
+    Each page is weighted by how many links it has (the ratio estimator), and the Wilson interval is computed on the effective
+    number of links: the links checked divided by the design effect of sampling them page by page.
+
+    :param clusters: The (weighted failed links, weighted links, links checked) of each sampled page.
+    :param z: The z-score of the confidence level.
+    :return: The estimated rate and the lower and upper bound of the interval.
+    """
+
+    weighted_links: float = sum(cluster[1] for cluster in clusters)
+
+    if weighted_links == 0:
+        return 0.0, 0.0, 1.0
+
+    rate: float = sum(cluster[0] for cluster in clusters) / weighted_links
+    links_checked: int = sum(cluster[2] for cluster in clusters)
+    page_count: int = len(clusters)
+
+    # Variance of the ratio estimator between pages
+    variance: float = 0.0
+
+    if page_count > 1:
+        variance = page_count / (page_count - 1) * sum((failed - rate * links) ** 2 for failed, links, _ in clusters) / weighted_links ** 2
+
+    if variance > 0:
+        # A design effect below 1 is noise, never count more links than were checked
+        effective_links: float = min(links_checked, rate * (1 - rate) / variance)
+    else:
+        # No spread to measure the correlation from (e.g. no failures yet), so assume the worst: one link per page
+        effective_links = page_count
+
+    lower, upper = wilson_interval(rate * effective_links, effective_links, z)
+
+    return rate, lower, upper
+
+
+def sample_page_links(session: requests.Session, headers: dict, page_id: str, confluence_info: dict, default_card_panel_name: str, card_info_skip: dict, link_ignore_types: list[str], ignore_links: list[str], timeout: int, links_per_page: int, verbose: bool) -> tuple[dict, int]:
+    """
+    Check a random sample of the links on a page.
+
+    :param session: The session to use.
+    :param headers: The headers to use.
+    :param page_id: The ID of the page.
+    :param confluence_info: The Confluence info.
+    :param default_card_panel_name: The default card panel name.
+    :param card_info_skip: The card info to skip.
+    :param link_ignore_types: The types of links to ignore.
+    :param ignore_links: The links to ignore.
+    :param timeout: The timeout to use.
+    :param links_per_page: The max number of links to check on the page.
+    :param verbose: Enable verbose mode.
+    :return: The sampled links and their statuses, and the number of links on the page.
+    """
+
+    confluence_base_url: str = confluence_info.get('base_url', '')
+    confluence_page_info_url: str = f'{confluence_base_url}{confluence_info.get("page_info_url", "")}'
+
+    page: dict = confluence_manager.get_page_info(session, page_id, confluence_page_info_url, confluence_base_url, default_card_panel_name, card_info_skip, verbose)
+    links: list[str] = confluence_manager.get_testable_links(page, confluence_base_url, link_ignore_types, ignore_links)
+    link_count: int = len(links)
+
+    if len(links) > links_per_page:
+        links = random.sample(links, links_per_page)
+
+    # The links are already absolute and filtered, so hand test_page_links just the sample
+    sampled_page: dict = {'Outgoing Links': {link: link for link in links}}
+
+    return confluence_manager.test_page_links(session, headers, sampled_page, confluence_base_url, [], [], timeout), link_count
+
+
+def print_estimates(title: str, stats: dict, z: float, limit: int | None = None) -> None:
+    """
+    Print the estimated failure rates.
+
+    :param title: The title of the table.
+    :param stats: The stats (name -> links checked and the clusters of estimate_rate).
+    :param z: The z-score of the confidence level.
+    :param limit: The max number of rows to print (most sampled first).
+    :return: None
+    """
+
+    print(f'{title}:')
+
+    rows: list = sorted(stats.items(), key=lambda item: item[1]['checked'], reverse=True)
+
+    if limit is not None:
+        rows = rows[:limit]
+
+    for name, counts in rows:
+        rate, lower, upper = estimate_rate(counts['clusters'], z)
+
+        print(f'  {name}: {rate * 100:.2f}% ({lower * 100:.2f}% - {upper * 100:.2f}%) from {counts["checked"]} links on {len(counts["clusters"])} pages')
+
+
+def run_sample(session: requests.Session, headers: dict, query_url: str, query_data: dict, spaces: list[str], batch_size: int, thread_count: int, confluence_info: dict, default_card_panel_name: str, card_info_skip: dict, link_ignore_types: list[str], ignore_links: list[str], timeout: int, precision: float, confidence: float, links_per_page: int, min_links: int, verbose: bool) -> None:
+    """
+    Estimate the link failure rate per space and per host from a random sample.
+
+    Every page of each space is enumerated, then pages are drawn at random and a few links are checked on each, until every
+    space's confidence interval is narrower than the requested precision or the space runs out of pages.
+
+    :param session: The session to use.
+    :param headers: The headers to use.
+    :param query_url: The query URL.
+    :param query_data: The query data to use.
+    :param spaces: The spaces to sample.
+    :param batch_size: The min number of pages to request per enumeration batch (the query's own page size is used if it is larger).
+    :param thread_count: The number of threads to use.
+    :param confluence_info: The Confluence info.
+    :param default_card_panel_name: The default card panel name.
+    :param card_info_skip: The card info to skip.
+    :param link_ignore_types: The types of links to ignore.
+    :param ignore_links: The links to ignore.
+    :param timeout: The timeout to use.
+    :param precision: The target half-width of each space's confidence interval (e.g. 0.02 for +/- 2%).
+    :param confidence: The confidence level of the intervals (e.g. 0.95).
+    :param links_per_page: The max number of links to check per sampled page.
+    :param min_links: The min number of links to check per space before stopping early.
+    :param verbose: Enable verbose mode.
+    :return: None
+    """
+
+    confidence_z: float = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+
+    # Every page is enumerated, so ask for as many per request as the query itself does (500 in the shipped query)
+    enumeration_batch_size: int = max(batch_size, int(query_data.get('variables', {}).get('first', batch_size)))
+
+    def enumerate_space(space_key: str) -> list[str]:
+        space_session: requests.Session = requests.Session()
+        space_session.cookies.update(session.cookies)
+        http2_manager.share_http2(session, space_session)
+
+        page_ids: list[str] = []
+
+        # The query returns the most recently edited pages first, so only the whole space gives an unbiased sample
+        for pages_raw in confluence_manager.get_space_pages(space_session, query_url, query_data, space_key, sys.maxsize, enumeration_batch_size):
+            page_ids.extend(page['id'] for page in pages_raw)
+
+        return page_ids
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(spaces))) as executor:
+        space_pages: dict = dict(zip(spaces, executor.map(enumerate_space, spaces)))
+
+    for space_key, page_ids in space_pages.items():
+        random.shuffle(page_ids)
+
+        if verbose:
+            print(f'Found {len(page_ids)} pages in {space_key}.')
+
+    space_stats: dict = {space_key: {'checked': 0, 'clusters': []} for space_key in spaces}
+    host_stats: dict = {}
+
+    thread_sessions: list[requests.Session] = []
+
+    for _ in range(0, thread_count):
+        thread_session: requests.Session = requests.Session()
+        thread_session.cookies.update(session.cookies)
+        http2_manager.share_http2(session, thread_session)
+        thread_sessions.append(thread_session)
+
+    def space_done(space_key: str) -> bool:
+        if len(space_pages[space_key]) == 0:
+            return True
+
+        stats: dict = space_stats[space_key]
+
+        if stats['checked'] < min_links:
+            return False
+
+        _, lower, upper = estimate_rate(stats['clusters'], confidence_z)
+
+        return (upper - lower) / 2 <= precision
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, thread_count)) as executor:
+        while True:
+            open_spaces: list[str] = [space_key for space_key in spaces if not space_done(space_key)]
+
+            if len(open_spaces) == 0:
+                break
+
+            # Spread each round's pages over the spaces that still need more precision
+            round_pages: list[tuple[str, str]] = []
+
+            while len(round_pages) < thread_count and any(len(space_pages[space_key]) > 0 for space_key in open_spaces):
+                for space_key in open_spaces:
+                    if len(space_pages[space_key]) > 0 and len(round_pages) < thread_count:
+                        round_pages.append((space_key, space_pages[space_key].pop()))
+
+            futures: dict = {}
+
+            for idx, (space_key, page_id) in enumerate(round_pages):
+                future = executor.submit(sample_page_links, thread_sessions[idx % thread_count], headers, page_id, confluence_info, default_card_panel_name, card_info_skip, link_ignore_types, ignore_links, timeout, links_per_page, verbose)
+                futures[future] = space_key
+
+            for future in concurrent.futures.as_completed(futures):
+                space_key: str = futures[future]
+
+                try:
+                    page_links, link_count = future.result()
+                except Exception as error:
+                    if verbose:
+                        print(f'Failed to sample a page in {space_key}: {error}')
+
+                    continue
+
+                if len(page_links) == 0:
+                    continue
+
+                # Each checked link stands for the links on the page that weren't sampled
+                weight: float = link_count / len(page_links)
+                host_counts: dict = {}
+
+                for link, status in page_links.items():
+                    host: str = urllib.parse.urlsplit(link).hostname or link
+
+                    host_counts.setdefault(host, [0, 0])
+                    host_counts[host][0] += int(status not in (200, 401))
+                    host_counts[host][1] += 1
+
+                space_stats[space_key]['checked'] += len(page_links)
+                space_stats[space_key]['clusters'].append((weight * sum(counts[0] for counts in host_counts.values()), float(link_count), len(page_links)))
+
+                for host, (failed, checked) in host_counts.items():
+                    host_stats.setdefault(host, {'checked': 0, 'clusters': []})
+                    host_stats[host]['checked'] += checked
+                    host_stats[host]['clusters'].append((weight * failed, weight * checked, checked))
+
+            if verbose:
+                print(' | '.join(f'{space_key}: {space_stats[space_key]["checked"]} links' for space_key in spaces), end='\r')
+
+    if verbose:
+        print()
+
+    print_estimates('Estimated failure rate per space', space_stats, confidence_z)
+    print_estimates('Estimated failure rate per host', host_stats, confidence_z, limit=20)
@@ -0,0 +1,57 @@
+import os
+import json
+import datetime
+
+
+# Sorts after every real page, so it is only handed out once the queue has been drained
+END_OF_PAGES: tuple = (float('inf'), '', None, None)
+
+
+def get_last_modified_priority(page_raw: dict) -> float:
+    """
+    Get the priority of an enumerated page from its last modified date, most recently edited first.
+
+    :param page_raw: The page as returned by the pages query.
+    :return: The priority (lower is checked sooner).
+    """
+
+    last_modified: str | None = (page_raw.get('lastModified', None) or {}).get('value', None)
+
+    if last_modified is None:
+        return 0.0
+
+    try:
+        return -datetime.datetime.fromisoformat(last_modified.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def load_previous_failures(history_path: str) -> set[str]:
+    """
+    Load the links that failed last run.
+
+    :param history_path: The path to the failure history.
+    :return: The links that failed last run.
+    """
+
+    if not os.path.exists(history_path):
+        return set()
+
+    try:
+        with open(history_path, 'r') as file:
+            return set(json.load(file))
+    except (OSError, ValueError):
+        return set()
+
+
+def save_failures(history_path: str, failed_links: set[str]) -> None:
+    """
+    Save the links that failed this run for the next run to prioritize.
+
+    :param history_path: The path to the failure history.
+    :param failed_links: The links that failed this run.
+    :return: None
+    """
+
+    with open(history_path, 'w') as file:
+        json.dump(sorted(failed_links), file, indent=4)